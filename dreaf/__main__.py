@@ -1,13 +1,4 @@
-from .bot import DreafBot
-
-bot = DreafBot()
-
-bot.load_extension("dreaf.testing")
-# bot.load_extension("dreaf.giftcodes")
-# bot.load_extension("dreaf.players")
-# bot.load_extension("dreaf.afk_events")
-# bot.load_extension("dreaf.items")
-bot.load_extension("dreaf.reddit")
-bot.load_extension("dreaf.commands.hero_images")
+from .bootstrap import Bootstrap
 
+bot = Bootstrap().run()
 bot.run()
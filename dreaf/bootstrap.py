@@ -0,0 +1,214 @@
+"""
+Application startup, run in explicit phases.
+
+Importing `dreaf` modules has no side effects: logging, the database, HTTP sessions and
+table creation all happen here, or lazily on first use. Each phase is timed so slow
+startups can be traced to the extension responsible.
+
+Startup time can be benchmarked without connecting to Discord:
+
+    python -m dreaf.bootstrap --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import logging
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import time
+import typing as t
+from logging import handlers
+
+if t.TYPE_CHECKING:
+    from dreaf.bot import DreafBot
+
+log = logging.getLogger(__name__)
+
+EXTENSIONS = (
+    "dreaf.testing",
+    # "dreaf.giftcodes",
+    # "dreaf.players",
+    # "dreaf.afk_events",
+    # "dreaf.items",
+    "dreaf.reddit",
+    "dreaf.commands.hero_images",
+    "dreaf.commands.database",
+)
+
+
+def setup_logging(log_path: pathlib.Path = pathlib.Path("logs")):
+    try:
+        import better_exceptions
+    except ImportError:
+        better_exceptions = None
+
+    if better_exceptions:
+        better_exceptions.hook()
+
+    debug_flag = bool(os.environ.get("DEBUG", False))
+
+    logging.getLogger().setLevel(logging.DEBUG)
+    discord_log = logging.getLogger("discord")
+    discord_log.setLevel(logging.DEBUG if debug_flag else logging.INFO)
+    dreaf_log = logging.getLogger("dreaf")
+
+    # setup log directory
+    log_path.mkdir(exist_ok=True)
+
+    # file handler factory
+    def create_fh(file_name):
+        fh_path = log_path/file_name
+        return handlers.RotatingFileHandler(
+            filename=fh_path, encoding='utf-8', mode='a',
+            maxBytes=400000, backupCount=20
+        )
+
+    # set log formatting
+    log_format = logging.Formatter(
+        '%(asctime)s %(name)s %(levelname)s %(module)s %(funcName)s %(lineno)d: '
+        '%(message)s',
+        datefmt="[%d/%m/%Y %H:%M]"
+    )
+
+    # create file handlers
+    dreaf_fh = create_fh('dreaf.log')
+    dreaf_fh.setLevel(logging.INFO)
+    dreaf_fh.setFormatter(log_format)
+    discord_fh = create_fh('discord.log')
+    discord_fh.setLevel(logging.INFO)
+    discord_fh.setFormatter(log_format)
+    discord_log.addHandler(discord_fh)
+
+    # create console handler
+    console_std = sys.stdout if debug_flag else sys.stderr
+    dreaf_console = logging.StreamHandler(console_std)
+    dreaf_console.setLevel(logging.INFO if debug_flag else logging.ERROR)
+    dreaf_console.setFormatter(log_format)
+    dreaf_log.addHandler(dreaf_console)
+    discord_console = logging.StreamHandler(console_std)
+    discord_console.setLevel(logging.ERROR)
+    discord_console.setFormatter(log_format)
+    discord_log.addHandler(discord_console)
+
+
+def setup_database():
+    from dreaf import constants, db
+
+    db.sql_stats.slow_threshold = constants.SQL_SLOW_MS / 1000
+    if constants.DB_BACKEND == "postgres":
+        from dreaf.db.postgres import PostgresBackend
+
+        db.use(PostgresBackend(
+            database=constants.DB_NAME,
+            user=constants.DB_USER,
+            password=constants.DB_PASSWORD,
+            host=constants.DB_HOST,
+            port=int(constants.DB_PORT),
+        ))
+    else:
+        db.connect()
+
+
+class Bootstrap:
+    """Runs each startup phase in order, recording how long each one took."""
+
+    def __init__(self):
+        self.timings: t.Dict[str, float] = dict()
+        self.bot: t.Optional[DreafBot] = None
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - start
+            log.info(f"Startup phase '{name}' took {self.timings[name] * 1000:.1f}ms.")
+
+    @property
+    def total(self) -> float:
+        return sum(self.timings.values())
+
+    def run(self, extensions: t.Iterable[str] = EXTENSIONS) -> DreafBot:
+        with self.phase("logging"):
+            setup_logging()
+
+        with self.phase("database"):
+            setup_database()
+
+        with self.phase("bot"):
+            from dreaf.bot import DreafBot
+            self.bot = DreafBot()
+
+        for extension in extensions:
+            with self.phase(extension):
+                self.bot.load_extension(extension)
+
+        # every table the loaded extensions registered is created together
+        with self.phase("tables"):
+            from dreaf import db
+            db.create_tables()
+
+        log.info(f"Startup took {self.total * 1000:.1f}ms.")
+        return self.bot
+
+
+def _measure(extensions: t.Sequence[str]):
+    """Run a single startup in this process and print its timings, for the benchmark."""
+    start = time.perf_counter()
+    bootstrap = Bootstrap()
+    bootstrap.run(extensions)
+    for name, seconds in bootstrap.timings.items():
+        print(f"timing\t{name}\t{seconds}")
+    print(f"timing\ttotal\t{time.perf_counter() - start}")
+
+
+def benchmark(extensions: t.Sequence[str], repeat: int) -> t.Dict[str, t.List[float]]:
+    """
+    Time cold starts, each in a fresh interpreter so no imports are cached.
+
+    The interpreter's own start up is included in `process`.
+    """
+    results: t.Dict[str, t.List[float]] = dict()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-m", "dreaf.bootstrap", "--measure", *extensions],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.setdefault("process", []).append(time.perf_counter() - start)
+        for line in output.splitlines():
+            # anything else printed, such as console logging, is ignored
+            if line.startswith("timing\t"):
+                _, name, seconds = line.split("\t")
+                results.setdefault(name, []).append(float(seconds))
+    return results
+
+
+def main(argv: t.Sequence[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark Dreaf's startup time.")
+    parser.add_argument("extensions", nargs="*", default=EXTENSIONS, help="Extensions to load.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of cold starts to time.")
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        _measure(args.extensions)
+        return
+
+    results = benchmark(args.extensions, args.repeat)
+    width = max(len(name) for name in results)
+    print(f"{'phase':<{width}}  {'median':>9}  {'min':>9}  {'max':>9}")
+    for name, samples in results.items():
+        print(
+            f"{name:<{width}}  {statistics.median(samples) * 1000:>7.1f}ms"
+            f"  {min(samples) * 1000:>7.1f}ms  {max(samples) * 1000:>7.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,8 @@ import discord
 from discord.ext import commands
 from discord.ext import context
 
-from dreaf import constants, ctx
+from dreaf import constants, ctx, db
+from dreaf.http import clients
 
 log = logging.getLogger(__name__)
 
@@ -20,11 +21,24 @@ class DreafBot(context.ContextClient, commands.Bot):
         self._global_reaction_triggers: t.Dict[str, t.Callable] = {
             constants.EMOJI_DELETE: self._delete_trigger,
         }
-        self.http_session = aiohttp.ClientSession()
+
+    @property
+    def http_session(self) -> aiohttp.ClientSession:
+        return clients.session("default")
 
     def run(self):
         super().run(constants.TOKEN)
 
+    async def close(self):
+        # cogs with connections or tokens to clean up get a chance to before HTTP is closed
+        for cog in list(self.cogs.values()):
+            shutdown = getattr(cog, "shutdown", None)
+            if shutdown:
+                await shutdown()
+        db.close()
+        await clients.close()
+        await super().close()
+
     @property
     def guild(self) -> discord.Guild:
         return self.get_guild(constants.GUILD_ID)
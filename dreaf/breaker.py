@@ -0,0 +1,142 @@
+"""
+Circuit breakers for the HTTP APIs the bot depends on, so an outage costs almost nothing.
+
+After a run of failures an endpoint's breaker opens, and requests to it fail immediately
+with `CircuitOpen` instead of waiting out their timeouts. Once the open period passes, a
+single probe request is let through: if it succeeds the breaker closes, otherwise it
+opens again for longer. Open periods grow exponentially with random jitter, so recovery
+is noticed quickly after a short blip without hammering an API through a long outage.
+"""
+from __future__ import annotations
+
+import asyncio
+import enum
+import logging
+import random
+import time
+import typing as t
+
+import aiohttp
+
+log = logging.getLogger(__name__)
+
+
+class State(enum.Enum):
+    closed = "closed"
+    open = "open"
+    half_open = "half-open"
+
+
+class CircuitOpen(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Endpoint '{name}' is unavailable, retry after {retry_after:.0f}s.")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_failure(exc: BaseException) -> bool:
+    """Whether an error means the endpoint is unhealthy, rather than the request being wrong."""
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status >= 500
+    return isinstance(exc, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+class CircuitBreaker:
+    """Tracks the health of one endpoint, opening after `threshold` failures in a row."""
+
+    def __init__(self, name: str, *, threshold: int = 5, base_timeout: float = 10, max_timeout: float = 600):
+        self.name = name
+        self.threshold = threshold
+        self.base_timeout = base_timeout
+        self.max_timeout = max_timeout
+        self.state = State.closed
+        self.failures = 0
+        self.trips = 0
+        self.opened_at: t.Optional[float] = None
+        self.timeout = 0.0
+        self._probing = False
+
+    def __repr__(self):
+        return f"<CircuitBreaker '{self.name}' {self.state.value} failures={self.failures}>"
+
+    @property
+    def retry_after(self) -> float:
+        if self.state is State.closed:
+            return 0.0
+        return max(self.opened_at + self.timeout - time.monotonic(), 0.0)
+
+    def allow(self):
+        """Raise `CircuitOpen` unless a request may be made now."""
+        if self.state is State.closed:
+            return
+        if self.state is State.open and not self.retry_after:
+            self.state = State.half_open
+            self._probing = False
+        if self.state is State.half_open and not self._probing:
+            # let a single request through to see if the endpoint has recovered
+            self._probing = True
+            return
+        raise CircuitOpen(self.name, self.retry_after or self.base_timeout)
+
+    def success(self):
+        if self.state is not State.closed:
+            log.info(f"Endpoint '{self.name}' recovered, closing its circuit.")
+        self.state = State.closed
+        self.failures = 0
+        self.trips = 0
+        self._probing = False
+
+    def failure(self):
+        self.failures += 1
+        if self.state is State.half_open or self.failures >= self.threshold:
+            self._trip()
+
+    def _trip(self):
+        self.trips += 1
+        limit = min(self.base_timeout * 2 ** (self.trips - 1), self.max_timeout)
+        # jittered between half and all of the limit, so breakers don't all probe together
+        self.timeout = random.uniform(limit / 2, limit)
+        self.opened_at = time.monotonic()
+        self.state = State.open
+        self._probing = False
+        log.warning(f"Endpoint '{self.name}' is failing, opening its circuit for {self.timeout:.0f}s.")
+
+    def status(self) -> t.Dict[str, t.Any]:
+        return {
+            "state": self.state.value,
+            "failures": self.failures,
+            "trips": self.trips,
+            "retry_after": self.retry_after,
+        }
+
+    async def __aenter__(self):
+        self.allow()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc is None:
+            self.success()
+        elif isinstance(exc, asyncio.CancelledError):
+            # nothing was learned, so let another request probe instead
+            self._probing = False
+        elif is_failure(exc):
+            self.failure()
+        elif self._probing:
+            # the endpoint answered, even if the request itself wasn't right
+            self.success()
+
+
+class Breakers(dict):
+    """A breaker for each endpoint of a service, created on first use."""
+
+    def __init__(self, service: str, **options: t.Any):
+        super().__init__()
+        self.service = service
+        self.options = options
+
+    def __missing__(self, name: str) -> CircuitBreaker:
+        breaker = self[name] = CircuitBreaker(f"{self.service} {name}", **self.options)
+        return breaker
+
+    def status(self) -> t.Dict[str, t.Dict[str, t.Any]]:
+        return {name: breaker.status() for name, breaker in self.items()}
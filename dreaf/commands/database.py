@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import textwrap
+import typing as t
+
+from discord.ext import commands
+
+from dreaf import checks, constants, db
+from dreaf.db.backup import BackupManager
+
+if t.TYPE_CHECKING:
+    from dreaf.bot import DreafBot
+
+log = logging.getLogger(__name__)
+
+
+class DatabaseCommands(commands.Cog, name="Database"):
+    """Database maintenance: scheduled backups, and commands to inspect them and SQL timings."""
+
+    def __init__(self, bot: DreafBot):
+        self.bot = bot
+        self.backups = BackupManager(keep=constants.BACKUP_KEEP)
+        self.backup_task = bot.loop.create_task(self.schedule_backups())
+        self.backup_task.add_done_callback(self.task_error)
+
+    def cog_unload(self):
+        self.backup_task.cancel()
+        self.backups.close()
+
+    @staticmethod
+    def task_error(task: asyncio.Task):
+        if task.cancelled():
+            return
+        if task.exception():
+            task.result()
+
+    async def schedule_backups(self):
+        await self.bot.wait_until_ready()
+        await self.backups.run(constants.BACKUP_INTERVAL_HOURS * 60 * 60)
+
+    @checks.is_owner()
+    @commands.group(name="debug", invoke_without_command=True)
+    async def debug(self, ctx: commands.Context):
+        """Inspect the bot's internals."""
+        await ctx.send_help(ctx.command)
+
+    @checks.is_owner()
+    @debug.group(name="sql", invoke_without_command=True)
+    async def debug_sql(self, ctx: commands.Context, limit: int = 10):
+        """Show SQL timings per table and for the slowest statements."""
+        stats = db.sql_stats
+        if not stats.templates:
+            await ctx.send("No SQL statements have been recorded.")
+            return
+
+        def ms(seconds: float) -> str:
+            return f"{seconds * 1000:.1f}ms"
+
+        def line(hist) -> str:
+            return (
+                f"{hist.count:>6}x total {ms(hist.total):>9} mean {ms(hist.mean):>7} "
+                f"p95 {ms(hist.percentile(95)):>7} max {ms(hist.max):>7}"
+            )
+
+        calls = sum(h.count for h in stats.templates.values())
+        total = sum(h.total for h in stats.templates.values())
+        output = [
+            f"{calls} statements in {ms(total)}, {stats.slow} slow, {sum(stats.repeats.values())} possible N+1",
+            "",
+            "By table:",
+        ]
+        for table, hist in sorted(stats.tables.items(), key=lambda i: i[1].total, reverse=True):
+            output.append(f"{table[:18]:<18} {line(hist)}")
+
+        output.extend(["", f"Top {limit} statements by total time:"])
+        by_total = sorted(stats.templates.items(), key=lambda i: i[1].total, reverse=True)
+        for sql, hist in by_total[:limit]:
+            output.append(line(hist))
+            output.append(f"  {textwrap.shorten(sql, 110)}")
+
+        text = "\n".join(output)
+        await ctx.send(f"```\n{text[:1980]}\n```")
+
+    @checks.is_owner()
+    @debug_sql.command(name="reset")
+    async def debug_sql_reset(self, ctx: commands.Context):
+        """Clear the recorded SQL timings."""
+        db.sql_stats.reset()
+        await ctx.send("SQL timings have been reset.")
+
+    @checks.is_owner()
+    @debug.group(name="backup", invoke_without_command=True)
+    async def debug_backup(self, ctx: commands.Context):
+        """Show the database backup snapshots."""
+        backups = self.backups
+        output = []
+        if backups.running:
+            output.append("A backup is running now.")
+        if backups.last:
+            last = backups.last
+            status = "skipped, unchanged" if last.skipped else f"took {last.seconds:.2f}s"
+            output.append(f"Last backup {last.finished.diff_for_humans()}, {status}.")
+
+        snapshots = backups.snapshots()
+        output.append(f"{len(snapshots)} of {backups.keep} snapshots kept in {backups.directory}:")
+        for path in snapshots:
+            output.append(f"{path.name}  {path.stat().st_size / 1024:>9.1f}KiB")
+
+        text = "\n".join(output)
+        await ctx.send(f"```\n{text[:1980]}\n```")
+
+    @checks.is_owner()
+    @debug_backup.command(name="now")
+    async def debug_backup_now(self, ctx: commands.Context):
+        """Take a backup snapshot straight away, even if nothing has changed."""
+        async with ctx.typing():
+            result = await self.backups.backup(force=True)
+        await ctx.send(f"Database backed up to `{result.path.name}` in {result.seconds:.2f}s.")
+
+
+def setup(bot: DreafBot):
+    bot.add_cog(DatabaseCommands(bot))
@@ -1,13 +1,6 @@
-import logging
 import os
 import sys
 
-from everstone import db
-
-from dreaf import db as sqlite_db
-
-_log = logging.getLogger(__name__)
-
 GUILD_ID: int = 732785236273922069
 PREFIX = '?'
 TOKEN = ''
@@ -25,80 +18,21 @@ AFK_CODE_FEED_CHANNEL = 814452504247009310
 BOT_SPAM_CHANNEL = 809789367153328188
 CODE_CHANNEL = 817608299842371654
 CODE_LOGS_CHANNEL = 837724788021002321
+DB_BACKEND = 'sqlite'
 DB_NAME = 'dreaf'
 DB_USER = 'dreaf'
 DB_PASSWORD = ''
 DB_HOST = 'localhost'
 DB_PORT = '5432'
-
-
-class PersistentGlobals(sqlite_db.Table):
-
-    def __init__(self):
-        self._cache = dict()
-
-    def get(self, key):
-        data = self._select(key)
-        return data[0] if data else None
-
-    def set(self, key, value):
-        self[key] = value
-
-    def __getitem__(self, key):
-        data = self._select(key)
-        if data:
-            return data[0]
-        else:
-            raise KeyError
-
-    def __setitem__(self, key, value):
-        self._insert(key, value)
-
-    def _select(self, key):
-        if key in self._cache:
-            return tuple([self._cache[key]])
-
-        cursor = sqlite_db.conn.execute(
-            """
-            SELECT value
-            FROM persistent_globals
-            WHERE key = ?;
-            """,
-            [key]
-        )
-        data = cursor.fetchone()
-        cursor.close()
-        return data
-
-    def _insert(self, key, value):
-        cursor = sqlite_db.conn.execute(
-            """
-            INSERT INTO persistent_globals(key, value) VALUES (?, ?)
-            ON CONFLICT(key)
-            DO UPDATE SET
-              value=excluded.value;
-            """,
-            [key, value]
-        )
-        sqlite_db.conn.commit()
-        cursor.close()
-        self._cache[key] = value
-
-    @staticmethod
-    def _create_table():
-        _log.info("Ensuring table exists: persistent_globals")
-        cursor = sqlite_db.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS persistent_globals (
-              key TEXT PRIMARY KEY,
-              value TEXT NULL
-            );
-            """
-        )
-        cursor.close()
-
-
-persistent_globals = PersistentGlobals()
+CATALOGUE_PATH = 'data/catalogue.sqlite'
+SQL_SLOW_MS = 100
+BACKUP_INTERVAL_HOURS = 6
+BACKUP_KEEP = 7
+REDDIT_RETENTION_DAYS = 90
+REDDIT_COMPACT_HOURS = 6
+REDEEM_CONCURRENCY = 8
+REDEEM_PER_ACCOUNT = 3
+REDEEM_TIMEOUT = 15.0
 
 
 def load_envs():
@@ -112,5 +46,3 @@ def load_envs():
 
 
 load_envs()
-
-# db.connect(DB_NAME, DB_USER, DB_PASSWORD, host=DB_HOST, port=DB_PORT)
@@ -0,0 +1,138 @@
+import abc
+import atexit
+import logging
+import sqlite3
+import typing as t
+from pathlib import Path
+
+from . import catalogue
+from .backends import Backend, SQLiteBackend
+from .repository import Repository
+from .stats import InstrumentedConnection, sql_stats
+
+PATH = Path("db/db.sqlite")
+
+# `conn`, `local` and `backend` are only set once the database is opened during startup,
+# or on first use, so importing this module has no side effects.
+conn: InstrumentedConnection
+# the local sqlite file for user data
+local: SQLiteBackend
+# where repositories read and write user data
+backend: Backend
+
+_all_tables = []
+_catalogue_tables = []
+_tables_created = False
+
+
+log = logging.getLogger(__name__)
+
+
+def connect(path: Path = PATH):
+    """Open the local user data database, if it isn't already."""
+    module = globals()
+    if "conn" in module:
+        return
+
+    path.parent.mkdir(exist_ok=True)
+    raw_conn = sqlite3.connect(path, cached_statements=256)
+    raw_conn.row_factory = sqlite3.Row
+    module["conn"] = InstrumentedConnection(raw_conn, sql_stats)
+    module["conn"].execute("PRAGMA journal_mode = WAL;")
+    module["conn"].execute("PRAGMA synchronous = NORMAL;")
+    module["local"] = SQLiteBackend(module["conn"])
+    module.setdefault("backend", module["local"])
+    log.info(f"Opened database '{path}'.")
+
+
+def __getattr__(name):
+    if name in ("conn", "local", "backend"):
+        connect()
+        return globals()[name]
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+def _backend() -> Backend:
+    if "backend" not in globals():
+        connect()
+    return globals()["backend"]
+
+
+def _opened() -> t.List[Backend]:
+    module = globals()
+    opened = [module.get("backend"), module.get("local")]
+    return [b for i, b in enumerate(opened) if b is not None and b not in opened[:i]]
+
+
+def commit():
+    """Mark a write as done, leaving the actual commit to the backend."""
+    _backend().commit()
+
+
+def flush():
+    """Commit any pending writes immediately."""
+    for opened in _opened():
+        opened.flush()
+
+
+def unit_of_work():
+    """Hold back commits for the duration of the block, committing them together at the end."""
+    return _backend().unit_of_work()
+
+
+def unit_of_work_async():
+    """The same as `unit_of_work`, for blocks that await, without blocking the event loop."""
+    return _backend().unit_of_work_async()
+
+
+def use(new_backend: Backend):
+    """Switch the backend used by repositories, ensuring all created tables exist on it."""
+    flush()
+    globals()["backend"] = new_backend
+    log.info(f"Database backend switched to {new_backend.name}.")
+    if _tables_created:
+        create_tables()
+
+
+def create_tables():
+    """
+    Create every registered table that doesn't exist yet.
+
+    This is run once during startup. Tables registered after that are created when defined.
+    """
+    global _tables_created
+    for table in _all_tables:
+        table._create_table()
+    _tables_created = True
+
+
+def close():
+    for opened in _opened():
+        opened.close()
+
+
+atexit.register(flush)
+
+
+class RecordNotFound(Exception):
+    ...
+
+
+class Table(abc.ABC):
+    # empty, so tables that are also slotted records don't gain a __dict__
+    __slots__ = ()
+
+    def __init_subclass__(cls, catalogue: bool = False, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if catalogue:
+            # catalogue tables are created when the catalogue is built, not at runtime
+            _catalogue_tables.append(cls)
+            return
+        _all_tables.append(cls)
+        if _tables_created:
+            cls._create_table()
+
+    @staticmethod
+    @abc.abstractmethod
+    def _create_table():
+        pass
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import abc
+import contextlib
+import sqlite3
+import typing as t
+
+from .batching import GroupCommit
+
+Params = t.Sequence[t.Any]
+
+
+class Backend(abc.ABC):
+    """The storage used by repositories, hiding which database engine is underneath."""
+
+    name: str
+
+    def __repr__(self):
+        return f"<{type(self).__name__}>"
+
+    @abc.abstractmethod
+    def execute(self, sql: str, params: Params = ()):
+        pass
+
+    @abc.abstractmethod
+    def executemany(self, sql: str, params: t.Iterable[Params]):
+        pass
+
+    @abc.abstractmethod
+    def fetchone(self, sql: str, params: Params = ()) -> t.Optional[t.Mapping]:
+        pass
+
+    @abc.abstractmethod
+    def fetchall(self, sql: str, params: Params = ()) -> t.List[t.Mapping]:
+        pass
+
+    @abc.abstractmethod
+    def table_exists(self, table: str) -> bool:
+        pass
+
+    def commit(self):
+        """Mark a write as done. Backends that don't batch writes have nothing to do."""
+
+    def flush(self):
+        """Make all writes durable now."""
+
+    def unit_of_work(self) -> t.ContextManager:
+        return contextlib.nullcontext()
+
+    # The async versions are for callers on the bot's event loop. Backends whose statements
+    # are quick local calls just run the synchronous method, while those that wait on a
+    # server override them so the loop keeps running meanwhile.
+
+    async def execute_async(self, sql: str, params: Params = ()):
+        self.execute(sql, params)
+
+    async def executemany_async(self, sql: str, params: t.Iterable[Params]):
+        self.executemany(sql, params)
+
+    async def fetchone_async(self, sql: str, params: Params = ()) -> t.Optional[t.Mapping]:
+        return self.fetchone(sql, params)
+
+    async def fetchall_async(self, sql: str, params: Params = ()) -> t.List[t.Mapping]:
+        return self.fetchall(sql, params)
+
+    @contextlib.asynccontextmanager
+    async def unit_of_work_async(self) -> t.AsyncIterator[Backend]:
+        with self.unit_of_work():
+            yield self
+
+    def close(self):
+        self.flush()
+
+
+class SQLiteBackend(Backend):
+    name = "sqlite"
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.writes = GroupCommit(conn)
+
+    def execute(self, sql: str, params: Params = ()):
+        self.conn.execute(sql, params)
+
+    def executemany(self, sql: str, params: t.Iterable[Params]):
+        self.conn.executemany(sql, params)
+
+    def fetchone(self, sql: str, params: Params = ()) -> t.Optional[sqlite3.Row]:
+        return self.conn.execute(sql, params).fetchone()
+
+    def fetchall(self, sql: str, params: Params = ()) -> t.List[sqlite3.Row]:
+        return self.conn.execute(sql, params).fetchall()
+
+    def table_exists(self, table: str) -> bool:
+        sql = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;"
+        return self.fetchone(sql, (table,)) is not None
+
+    def commit(self):
+        self.writes.mark_dirty()
+
+    def flush(self):
+        self.writes.flush()
+
+    def unit_of_work(self) -> t.ContextManager:
+        return self.writes.unit_of_work()
@@ -0,0 +1,131 @@
+"""
+Online backups of the user data database, taken while the bot keeps running.
+
+Snapshots are made with SQLite's backup API on a worker thread with its own read-only
+connection, copying a few pages per step and sleeping between steps so writers are never
+held up for long and the event loop is never blocked. If the database is written to in the
+middle of a backup, SQLite restarts it from the beginning, so every snapshot is consistent.
+
+When nothing has been committed since the last snapshot, the backup is skipped.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+import pendulum
+
+from dreaf import db
+
+log = logging.getLogger(__name__)
+
+PATH = Path("db/backups")
+
+
+class BackupResult(t.NamedTuple):
+    finished: pendulum.DateTime
+    path: t.Optional[Path]
+    seconds: float
+
+    @property
+    def skipped(self) -> bool:
+        return self.path is None
+
+
+class BackupManager:
+    """Takes snapshots of `source` into `directory`, keeping only the newest `keep` of them."""
+
+    def __init__(
+        self,
+        source: Path = db.PATH,
+        directory: Path = PATH,
+        *,
+        keep: int = 7,
+        pages: int = 256,
+        sleep: float = 0.005,
+    ):
+        self.source = source
+        self.directory = directory
+        self.keep = keep
+        self.pages = pages
+        self.sleep = sleep
+        self.last: t.Optional[BackupResult] = None
+        self._lock = asyncio.Lock()
+        self._thread_lock = threading.Lock()
+        self._conn: t.Optional[sqlite3.Connection] = None
+        self._data_version: t.Optional[int] = None
+
+    def __repr__(self):
+        return f"<BackupManager '{self.source}' keep={self.keep}>"
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def snapshots(self) -> t.List[Path]:
+        """Existing snapshots, newest first."""
+        return sorted(self.directory.glob(f"{self.source.stem}-*{self.source.suffix}"), reverse=True)
+
+    async def backup(self, *, force: bool = False) -> BackupResult:
+        """Take a snapshot, unless nothing has changed since the last one and `force` isn't set."""
+        async with self._lock:
+            # include writes still waiting on the group commit
+            db.flush()
+            loop = asyncio.get_running_loop()
+            self.last = await loop.run_in_executor(None, self._backup, force)
+            return self.last
+
+    async def run(self, interval: float):
+        """Take a snapshot every `interval` seconds."""
+        while True:
+            result = await self.backup()
+            if result.skipped:
+                log.info("Database unchanged since the last backup, skipping.")
+            await asyncio.sleep(interval)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(f"file:{self.source}?mode=ro", uri=True, check_same_thread=False)
+        return self._conn
+
+    def _backup(self, force: bool) -> BackupResult:
+        with self._thread_lock:
+            start = time.perf_counter()
+            conn = self._connect()
+            # changes whenever another connection commits, so it tells us if there's anything new
+            data_version = conn.execute("PRAGMA data_version;").fetchone()[0]
+            if not force and data_version == self._data_version and self.snapshots():
+                return BackupResult(pendulum.now("UTC"), None, time.perf_counter() - start)
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            timestamp = pendulum.now("UTC").format("YYYYMMDD-HHmmss")
+            path = self.directory/f"{self.source.stem}-{timestamp}{self.source.suffix}"
+            temp = path.with_suffix(".tmp")
+            target = sqlite3.connect(temp)
+            try:
+                conn.backup(target, pages=self.pages, sleep=self.sleep)
+            finally:
+                target.close()
+            temp.replace(path)
+
+            self._data_version = data_version
+            self._rotate()
+            seconds = time.perf_counter() - start
+            log.info(f"Database backed up to '{path}' in {seconds:.2f}s.")
+            return BackupResult(pendulum.now("UTC"), path, seconds)
+
+    def _rotate(self):
+        for old in self.snapshots()[self.keep:]:
+            old.unlink(missing_ok=True)
+            log.info(f"Removed old database backup '{old}'.")
+
+    def close(self):
+        with self._thread_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,75 @@
+import asyncio
+import contextlib
+import logging
+import sqlite3
+import typing as t
+
+log = logging.getLogger(__name__)
+
+
+class GroupCommit:
+    """
+    Collects writes made on a connection and commits them together.
+
+    Pending writes are committed once `max_pending` have been made, or `max_delay` seconds
+    after the first uncommitted write, whichever comes first. When there's no running event
+    loop to schedule the delayed commit, writes are committed straight away.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, *, max_pending: int = 50, max_delay: float = 0.5):
+        self.conn = conn
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self.pending = 0
+        self._held = 0
+        self._timer: t.Optional[asyncio.TimerHandle] = None
+
+    def __repr__(self):
+        return f"<GroupCommit pending={self.pending} held={bool(self._held)}>"
+
+    def mark_dirty(self):
+        """Register a write that needs committing."""
+        self.pending += 1
+        if self._held:
+            return
+
+        if self.pending >= self.max_pending:
+            self.flush()
+            return
+
+        if self._timer is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.flush()
+                return
+            self._timer = loop.call_later(self.max_delay, self.flush)
+
+    def flush(self):
+        """Commit all pending writes now."""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+        if not self.pending:
+            return
+
+        count, self.pending = self.pending, 0
+        self.conn.commit()
+        log.debug(f"Group commit flushed {count} write(s).")
+
+    @contextlib.contextmanager
+    def unit_of_work(self):
+        """
+        Hold back commits until the block exits, then commit everything written within it.
+
+        Writes that succeeded before an exception are still committed, the same as if they
+        had each been committed on their own.
+        """
+        self._held += 1
+        try:
+            yield self
+        finally:
+            self._held -= 1
+            if not self._held:
+                self.flush()
@@ -0,0 +1,78 @@
+"""
+The read-only game catalogue: heroes and the reference tables describing them.
+
+The catalogue is built from the CSV files in `data/` into its own database file, ideally
+when the image is built:
+
+    python -m dreaf.db.catalogue
+
+It's written to `CATALOGUE_PATH`, which the Docker image points outside `/bot`, as the
+source tree is mounted read-only over it at runtime.
+
+At runtime it's opened immutable and memory-mapped, so lookups never take locks or contend
+with writes to the user data database.
+"""
+import logging
+import sqlite3
+from pathlib import Path
+
+from dreaf import constants
+from .stats import InstrumentedConnection, sql_stats
+
+log = logging.getLogger(__name__)
+
+PATH = Path(constants.CATALOGUE_PATH)
+MMAP_SIZE = 64 * 1024 * 1024
+
+
+def _tables():
+    from dreaf import db
+    import dreaf.game.heroes  # noqa: F401 registers the catalogue tables
+
+    return db._catalogue_tables
+
+
+def connect(path: Path = PATH) -> sqlite3.Connection:
+    """Open the catalogue read-only, building it first if it doesn't exist yet."""
+    if not path.exists():
+        log.warning(f"Catalogue database not found at '{path}', building it now.")
+        build(path)
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE};")
+    return InstrumentedConnection(conn, sql_stats)
+
+
+def build(path: Path = PATH):
+    """Build the catalogue database from the default CSV data, replacing any existing file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_suffix(".tmp")
+    temp.unlink(missing_ok=True)
+    build_conn = sqlite3.connect(temp)
+    build_conn.row_factory = sqlite3.Row
+    build_conn.execute("PRAGMA synchronous = OFF;")
+
+    try:
+        # the tables write through the build connection, as `conn` is read-only once opened
+        for table in _tables():
+            table._create_table(build_conn)
+        build_conn.commit()
+        build_conn.execute("VACUUM;")
+    finally:
+        build_conn.close()
+
+    temp.replace(path)
+    log.info(f"Catalogue database built at '{path}'.")
+
+
+def __getattr__(name):
+    # the catalogue is only opened once a catalogue table is first used
+    if name == "conn":
+        globals()["conn"] = connect()
+        return globals()["conn"]
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+if __name__ == "__main__":
+    build()
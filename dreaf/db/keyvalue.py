@@ -0,0 +1,186 @@
+"""
+A typed, namespaced key-value store for small bits of state the bot needs to remember.
+
+    from dreaf.db.keyvalue import kv
+
+    code_message = kv.namespace("giftcodes", int)
+    message_id = await code_message.get("message_id")
+    await code_message.set("message_id", message.id)
+
+Values are stored as JSON, so they come back as the type they were saved as. A namespace
+can be given a type, which every value set in it is checked against. Each key can expire
+after a TTL, after which it reads as missing.
+
+Each namespace is loaded in full on first use and served from memory after that. Writes
+go to the database straight away but are committed in groups along with other writes.
+Expired keys are deleted from the table at startup and then at most hourly, as keys are set.
+
+The namespace methods are async so callers won't change if the store moves to an async
+driver, but for now they never yield: loading a namespace and every write are ordinary
+synchronous queries, which block the event loop while they run like any other.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import math
+import time
+import typing as t
+
+from dreaf import db
+
+log = logging.getLogger(__name__)
+
+V = t.TypeVar("V")
+
+
+class _Entry(t.NamedTuple):
+    value: t.Any
+    expires: t.Optional[int]
+
+    def expired(self, now: float) -> bool:
+        return self.expires is not None and self.expires <= now
+
+
+class Namespace(t.Generic[V]):
+    """The keys in a single namespace, optionally restricted to values of one type."""
+
+    def __init__(self, store: KeyValueStore, name: str, value_type: t.Type[V] = None):
+        self.store = store
+        self.name = name
+        self.value_type = value_type
+
+    def __repr__(self):
+        value_type = f" {self.value_type.__name__}" if self.value_type else ""
+        return f"<Namespace '{self.name}'{value_type}>"
+
+    def _check(self, value: t.Any):
+        # bool is a subclass of int, but a flag being accepted as an ID is never intended
+        if self.value_type and (
+            not isinstance(value, self.value_type)
+            or (isinstance(value, bool) and self.value_type is not bool)
+        ):
+            raise TypeError(
+                f"Namespace '{self.name}' stores {self.value_type.__name__} values, "
+                f"got {type(value).__name__}."
+            )
+
+    async def get(self, key: str, default: t.Any = None) -> t.Optional[V]:
+        entry = self.store._get(self.name, key)
+        return default if entry is None else entry.value
+
+    async def set(self, key: str, value: V, *, ttl: float = None):
+        """Set a key, which expires after `ttl` seconds if given, rounded up to a whole second."""
+        self._check(value)
+        self.store._set(self.name, key, value, ttl)
+
+    async def delete(self, key: str):
+        self.store._delete(self.name, key)
+
+    async def compare_and_set(self, key: str, expected: t.Optional[V], value: V, *, ttl: float = None) -> bool:
+        """
+        Set a key only if its current value is `expected`, where None means it isn't set.
+
+        Returns whether the value was set. The check and the write happen without yielding
+        to the event loop, so no other task can change the key in between.
+        """
+        self._check(value)
+        entry = self.store._get(self.name, key)
+        current = None if entry is None else entry.value
+        if current != expected:
+            return False
+        self.store._set(self.name, key, value, ttl)
+        return True
+
+    async def items(self) -> t.Dict[str, V]:
+        now = time.time()
+        return {k: e.value for k, e in self.store._load(self.name).items() if not e.expired(now)}
+
+
+class KeyValueStore(db.Table):
+    # the least time between sweeps of expired keys when setting one, in seconds
+    PURGE_INTERVAL = 60 * 60
+
+    _repo = db.Repository(
+        "kv_store",
+        {
+            "namespace": "TEXT NOT NULL",
+            "key": "TEXT NOT NULL",
+            "value": "TEXT NOT NULL",
+            "expires": "INT NULL",
+        },
+        key=("namespace", "key"),
+    )
+
+    def __init__(self):
+        self._cache: t.Dict[str, t.Dict[str, _Entry]] = dict()
+        self._purged = time.monotonic()
+
+    def namespace(self, name: str, value_type: t.Type[V] = None) -> Namespace[V]:
+        return Namespace(self, name, value_type)
+
+    def _load(self, namespace: str) -> t.Dict[str, _Entry]:
+        entries = self._cache.get(namespace)
+        if entries is None:
+            rows = self._repo.select_all(namespace=namespace, columns=("key", "value", "expires"))
+            entries = self._cache[namespace] = {
+                key: _Entry(json.loads(value), expires) for key, value, expires in rows
+            }
+        return entries
+
+    def _get(self, namespace: str, key: str) -> t.Optional[_Entry]:
+        entries = self._load(namespace)
+        entry = entries.get(key)
+        if entry is not None and entry.expired(time.time()):
+            self._delete(namespace, key)
+            return None
+        return entry
+
+    def _set(self, namespace: str, key: str, value: t.Any, ttl: t.Optional[float]):
+        expires = math.ceil(time.time() + ttl) if ttl is not None else None
+        self._repo.upsert(namespace=namespace, key=key, value=json.dumps(value), expires=expires)
+        self._load(namespace)[key] = _Entry(value, expires)
+        if time.monotonic() - self._purged >= self.PURGE_INTERVAL:
+            self.purge_expired()
+
+    def _delete(self, namespace: str, key: str):
+        self._repo.delete(namespace, key)
+        self._load(namespace).pop(key, None)
+
+    def purge_expired(self):
+        """Delete every expired key, including those in namespaces that haven't been loaded."""
+        now = time.time()
+        for entries in self._cache.values():
+            for key in [k for k, e in entries.items() if e.expired(now)]:
+                del entries[key]
+        self._delete_expired(now)
+        self._purged = time.monotonic()
+
+    @classmethod
+    def _delete_expired(cls, now: float):
+        cls._repo.delete_where(where="expires <= ?", params=[int(now)])
+
+    @classmethod
+    def _create_table(cls):
+        cls._repo.create()
+        if db.backend.table_exists("persistent_globals"):
+            cls._import_persistent_globals()
+        # nothing has been loaded yet, so only the table needs sweeping
+        cls._delete_expired(time.time())
+
+    @classmethod
+    def _import_persistent_globals(cls):
+        """Move the values saved by the old `PersistentGlobals` into the 'globals' namespace."""
+        rows = db.backend.fetchall("SELECT key, value FROM persistent_globals;")
+        with db.unit_of_work():
+            for key, value in rows:
+                # everything used to be saved as text, including IDs
+                if value is not None and value.isdigit():
+                    value = int(value)
+                cls._repo.upsert(namespace="globals", key=key, value=json.dumps(value), expires=None)
+            db.backend.execute("DROP TABLE persistent_globals;")
+            db.commit()
+        log.info(f"Moved {len(rows)} persistent global(s) into the key-value store.")
+
+
+kv = KeyValueStore()
@@ -0,0 +1,225 @@
+"""
+Copy the user data tables from an SQLite database file into PostgreSQL.
+
+    python -m dreaf.db.migrate --source db/db.sqlite --dsn postgresql://dreaf@localhost/dreaf
+
+Rows are streamed in primary key order and copied in batches, so memory use stays bounded
+no matter the table size. Progress is saved after every batch, and running the command
+again resumes where it stopped. Each table is verified afterwards by comparing row counts
+and an order-independent checksum of every row.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import sys
+import typing as t
+from pathlib import Path
+
+from .postgres import asyncpg, translate
+
+DEFAULT_TABLES = (
+    "players",
+    "codes",
+    "code_rewards",
+    "redeemed_codes",
+    "items",
+    "afkarena_posted",
+    "labpath_posted",
+    "kv_store",
+)
+
+_CREATE_TABLE = re.compile(r"^\s*CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?", re.IGNORECASE)
+
+
+class MigrationError(Exception):
+    pass
+
+
+class SourceTable:
+    """The layout of a table in the SQLite source, and how to convert its values for PostgreSQL."""
+
+    def __init__(self, conn: sqlite3.Connection, name: str):
+        self.conn = conn
+        self.name = name
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?;", [name]).fetchone()
+        if not row:
+            raise MigrationError(f"Table '{name}' doesn't exist in the source database.")
+        self.ddl = _CREATE_TABLE.sub("CREATE TABLE IF NOT EXISTS ", row[0], count=1)
+
+        info = conn.execute(f"PRAGMA table_info({name});").fetchall()
+        self.columns = tuple(c[1] for c in info)
+        self.key = tuple(c[1] for c in sorted((c for c in info if c[5]), key=lambda c: c[5])) or ("rowid",)
+        self._converters = tuple(self._converter(c[2]) for c in info)
+
+    @staticmethod
+    def _converter(declared_type: str) -> t.Callable[[t.Any], t.Any]:
+        declared_type = declared_type.upper()
+        if "BOOL" in declared_type:
+            return bool
+        if "INT" in declared_type:
+            return int
+        if "TEXT" in declared_type or "CHAR" in declared_type:
+            return str
+        return lambda value: value
+
+    def convert(self, row: t.Sequence[t.Any]) -> t.Tuple:
+        return tuple(None if v is None else convert(v) for convert, v in zip(self._converters, row))
+
+    def count(self) -> int:
+        return self.conn.execute(f"SELECT COUNT(*) FROM {self.name};").fetchone()[0]
+
+    def stream(self, after: t.Optional[t.Sequence[t.Any]], batch_size: int) -> t.Iterator[t.Tuple[t.List[t.Tuple], t.List]]:
+        """Yield batches of converted rows along with the key of the last row in each batch."""
+        key = ", ".join(self.key)
+        sql = f"SELECT {key}, {', '.join(self.columns)} FROM {self.name}"
+        params = []
+        if after is not None:
+            sql += f" WHERE ({key}) > ({', '.join('?' * len(self.key))})"
+            params = list(after)
+        cursor = self.conn.execute(f"{sql} ORDER BY {key};", params)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                size = len(self.key)
+                yield [self.convert(r[size:]) for r in rows], list(rows[-1][:size])
+        finally:
+            cursor.close()
+
+
+class MigrationState:
+    """Per-table progress, saved to a JSON file after every batch so a migration can be resumed."""
+
+    def __init__(self, path: Path, *, restart: bool = False):
+        self.path = path
+        self.tables: t.Dict[str, t.Dict[str, t.Any]] = dict()
+        if path.exists() and not restart:
+            self.tables = json.loads(path.read_text())
+
+    def get(self, table: str) -> t.Dict[str, t.Any]:
+        return self.tables.setdefault(table, {"last_key": None, "copied": 0, "done": False})
+
+    def save(self):
+        temp = self.path.with_suffix(".tmp")
+        temp.write_text(json.dumps(self.tables, indent=2))
+        temp.replace(self.path)
+
+
+def row_checksum(rows: t.Iterable[t.Sequence[t.Any]], checksum: int = 0) -> int:
+    """Add each row's hash to a running checksum. Row order doesn't affect the result."""
+    for row in rows:
+        digest = hashlib.blake2b(repr(tuple(row)).encode(), digest_size=16).digest()
+        checksum = (checksum + int.from_bytes(digest, "big")) % (1 << 128)
+    return checksum
+
+
+async def copy_table(
+    source: SourceTable,
+    target: asyncpg.Connection,
+    state: MigrationState,
+    *,
+    batch_size: int,
+):
+    progress = state.get(source.name)
+    if progress["done"]:
+        print(f"{source.name}: already copied, skipping.")
+        return
+
+    await target.execute(translate(source.ddl))
+    insert = translate(
+        f"INSERT INTO {source.name}({', '.join(source.columns)}) "
+        f"VALUES ({', '.join('?' * len(source.columns))}) ON CONFLICT DO NOTHING;"
+    )
+
+    total = source.count()
+    for rows, last_key in source.stream(progress["last_key"], batch_size):
+        try:
+            async with target.transaction():
+                await target.copy_records_to_table(source.name, records=rows, columns=source.columns)
+        except asyncpg.UniqueViolationError:
+            # the batch was partly written before an interruption, so fall back to skipping existing rows
+            async with target.transaction():
+                await target.executemany(insert, rows)
+
+        progress["last_key"] = last_key
+        progress["copied"] += len(rows)
+        state.save()
+        print(f"{source.name}: {progress['copied']}/{total} rows copied.")
+
+    progress["done"] = True
+    state.save()
+
+
+async def verify_table(source: SourceTable, target: asyncpg.Connection, *, batch_size: int) -> bool:
+    source_count = source.count()
+    target_count = await target.fetchval(f"SELECT COUNT(*) FROM {source.name};")
+
+    source_sum = 0
+    for rows, _ in source.stream(None, batch_size):
+        source_sum = row_checksum(rows, source_sum)
+
+    target_sum = 0
+    async with target.transaction():
+        query = f"SELECT {', '.join(source.columns)} FROM {source.name};"
+        async for record in target.cursor(query, prefetch=batch_size):
+            target_sum = row_checksum([tuple(record)], target_sum)
+
+    if source_count != target_count:
+        print(f"{source.name}: row count mismatch, {source_count} in source and {target_count} in target.")
+        return False
+    if source_sum != target_sum:
+        print(f"{source.name}: checksum mismatch, {source_sum:032x} in source and {target_sum:032x} in target.")
+        return False
+
+    print(f"{source.name}: verified {target_count} rows, checksum {target_sum:032x}.")
+    return True
+
+
+async def migrate(args: argparse.Namespace) -> bool:
+    source_conn = sqlite3.connect(f"file:{args.source}?mode=ro", uri=True)
+    state = MigrationState(Path(args.state), restart=args.restart)
+    target = await asyncpg.connect(args.dsn)
+    try:
+        ok = True
+        for name in args.tables:
+            try:
+                source = SourceTable(source_conn, name)
+            except MigrationError as e:
+                print(f"{name}: {e}")
+                continue
+
+            if not args.verify_only:
+                await copy_table(source, target, state, batch_size=args.batch_size)
+            ok = await verify_table(source, target, batch_size=args.batch_size) and ok
+        return ok
+    finally:
+        await target.close()
+        source_conn.close()
+
+
+def main(argv: t.Sequence[str] = None):
+    parser = argparse.ArgumentParser(description="Copy the Dreaf SQLite database into PostgreSQL.")
+    parser.add_argument("--source", default="db/db.sqlite", help="SQLite database file to copy from.")
+    parser.add_argument("--dsn", required=True, help="PostgreSQL connection string to copy to.")
+    parser.add_argument("--tables", nargs="+", default=DEFAULT_TABLES, help="Tables to copy.")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows to copy per batch.")
+    parser.add_argument("--state", default="db/migrate_state.json", help="File tracking progress for resuming.")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved progress and copy from the start.")
+    parser.add_argument("--verify-only", action="store_true", help="Only compare row counts and checksums.")
+    args = parser.parse_args(argv)
+
+    if asyncpg is None:
+        parser.error("The asyncpg package is required to migrate to PostgreSQL.")
+
+    ok = asyncio.run(migrate(args))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
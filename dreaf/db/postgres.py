@@ -0,0 +1,191 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import logging
+import re
+import threading
+import typing as t
+
+from .backends import Backend, Params
+from .stats import sql_stats
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+log = logging.getLogger(__name__)
+
+_DDL_TYPES = re.compile(r"\bINT(EGER)?\b", re.IGNORECASE)
+_DDL_COLLATE = re.compile(r"\s+COLLATE\s+nocase\b", re.IGNORECASE)
+
+
+def translate(sql: str) -> str:
+    """
+    Convert an SQLite statement to its PostgreSQL equivalent.
+
+    `?` placeholders become numbered `$n` ones, skipping any inside string literals. Table
+    definitions have their integers widened to BIGINT, as Discord IDs and timestamps don't
+    fit in a PostgreSQL INT, and SQLite's nocase collation is dropped.
+    """
+    parts = []
+    count = 0
+    quoted = False
+    for char in sql:
+        if char == "'":
+            quoted = not quoted
+        elif char == "?" and not quoted:
+            count += 1
+            char = f"${count}"
+        parts.append(char)
+    sql = "".join(parts)
+
+    if sql.lstrip().upper().startswith("CREATE"):
+        sql = _DDL_COLLATE.sub("", _DDL_TYPES.sub("BIGINT", sql))
+    return sql
+
+
+class PostgresBackend(Backend):
+    """
+    Runs statements on pooled asyncpg connections, owned by an event loop in a background thread.
+
+    The synchronous methods keep the existing models working unchanged, but they block the
+    calling thread until the statement finishes, so called from the bot's event loop they
+    stall it the same way SQLite does. Callers on the loop should use the `_async` methods,
+    which wait on the pool without blocking, so statements from many tasks run side by side
+    on the pool's connections.
+
+    Statements autocommit, except within a unit of work, which runs them in a transaction on
+    one connection. Which connection that is follows the current context, so each task has
+    its own unit of work even though they all share the loop's thread.
+    """
+
+    name = "postgres"
+
+    def __init__(self, *, min_size: int = 1, max_size: int = 10, timeout: float = 10, **connect_kwargs):
+        if asyncpg is None:
+            raise RuntimeError("The asyncpg package is required to use the PostgreSQL backend.")
+
+        self.timeout = timeout
+        self._statements: t.Dict[str, str] = dict()
+        self._conn: contextvars.ContextVar = contextvars.ContextVar(
+            f"postgres_conn_{id(self)}", default=None
+        )
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="postgres-pool", daemon=True)
+        self._thread.start()
+        self.pool: asyncpg.Pool = self._run(
+            asyncpg.create_pool(min_size=min_size, max_size=max_size, **connect_kwargs)
+        )
+        log.info(f"PostgreSQL pool connected with {min_size}-{max_size} connections.")
+
+    def _submit(self, coro: t.Awaitable) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _run(self, coro: t.Awaitable):
+        return self._submit(coro).result(self.timeout)
+
+    async def _run_async(self, coro: t.Awaitable):
+        return await asyncio.wait_for(asyncio.wrap_future(self._submit(coro)), self.timeout)
+
+    @property
+    def _target(self) -> t.Union["asyncpg.Pool", "asyncpg.Connection"]:
+        # the connection of the unit of work the caller is in, if any
+        return self._conn.get() or self.pool
+
+    def _translate(self, sql: str) -> str:
+        translated = self._statements.get(sql)
+        if translated is None:
+            translated = self._statements[sql] = translate(sql)
+        return translated
+
+    def execute(self, sql: str, params: Params = ()):
+        with sql_stats.timed(sql):
+            self._run(self._target.execute(self._translate(sql), *params))
+
+    def executemany(self, sql: str, params: t.Iterable[Params]):
+        with sql_stats.timed(sql):
+            self._run(self._target.executemany(self._translate(sql), [tuple(p) for p in params]))
+
+    def fetchone(self, sql: str, params: Params = ()) -> t.Optional["asyncpg.Record"]:
+        with sql_stats.timed(sql):
+            return self._run(self._target.fetchrow(self._translate(sql), *params))
+
+    def fetchall(self, sql: str, params: Params = ()) -> t.List["asyncpg.Record"]:
+        with sql_stats.timed(sql):
+            return self._run(self._target.fetch(self._translate(sql), *params))
+
+    async def execute_async(self, sql: str, params: Params = ()):
+        with sql_stats.timed(sql):
+            await self._run_async(self._target.execute(self._translate(sql), *params))
+
+    async def executemany_async(self, sql: str, params: t.Iterable[Params]):
+        with sql_stats.timed(sql):
+            await self._run_async(self._target.executemany(self._translate(sql), [tuple(p) for p in params]))
+
+    async def fetchone_async(self, sql: str, params: Params = ()) -> t.Optional["asyncpg.Record"]:
+        with sql_stats.timed(sql):
+            return await self._run_async(self._target.fetchrow(self._translate(sql), *params))
+
+    async def fetchall_async(self, sql: str, params: Params = ()) -> t.List["asyncpg.Record"]:
+        with sql_stats.timed(sql):
+            return await self._run_async(self._target.fetch(self._translate(sql), *params))
+
+    def table_exists(self, table: str) -> bool:
+        return self.fetchone("SELECT to_regclass(?) IS NOT NULL;", (table,))[0]
+
+    @contextlib.contextmanager
+    def unit_of_work(self):
+        """
+        Run the block's statements in one transaction, committed when it exits.
+
+        An exception rolls back everything written in the block, and nested units join the
+        outermost transaction.
+        """
+        if self._conn.get() is not None:
+            yield self
+            return
+
+        conn = self._run(self.pool.acquire())
+        transaction = conn.transaction()
+        token = self._conn.set(conn)
+        try:
+            self._run(transaction.start())
+            try:
+                yield self
+            except BaseException:
+                self._run(transaction.rollback())
+                raise
+            self._run(transaction.commit())
+        finally:
+            self._conn.reset(token)
+            self._run(self.pool.release(conn))
+
+    @contextlib.asynccontextmanager
+    async def unit_of_work_async(self):
+        """The same as `unit_of_work`, but without blocking the event loop."""
+        if self._conn.get() is not None:
+            yield self
+            return
+
+        conn = await self._run_async(self.pool.acquire())
+        transaction = conn.transaction()
+        token = self._conn.set(conn)
+        try:
+            await self._run_async(transaction.start())
+            try:
+                yield self
+            except BaseException:
+                await self._run_async(transaction.rollback())
+                raise
+            await self._run_async(transaction.commit())
+        finally:
+            self._conn.reset(token)
+            await self._run_async(self.pool.release(conn))
+
+    def close(self):
+        self._run(self.pool.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(self.timeout)
+        log.info("PostgreSQL pool closed.")
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import typing as t
+
+from dreaf import db
+from .stats import sql_stats
+
+log = logging.getLogger(__name__)
+
+Row = t.Mapping[str, t.Any]
+
+
+class Repository:
+    """
+    Generates and runs the common SQL statements for a single table.
+
+    Statements are built once per shape and the same SQL text is reused on every call, so
+    the backend's prepared statement cache is hit rather than the SQL being reparsed.
+    """
+
+    # keep well under SQLite's default limit of 999 bound parameters
+    IN_BATCH_SIZE = 500
+
+    def __init__(
+        self,
+        table: str,
+        columns: t.Dict[str, str],
+        *,
+        key: t.Union[str, t.Sequence[str]],
+        indexes: t.Sequence[str] = (),
+    ):
+        self.table = table
+        self.definitions = columns
+        self.columns = tuple(columns)
+        self.key = (key,) if isinstance(key, str) else tuple(key)
+        self.indexes = tuple(indexes)
+        self._statements: t.Dict[t.Tuple, str] = dict()
+
+    def __repr__(self):
+        return f"<Repository '{self.table}'>"
+
+    def __set_name__(self, owner, name):
+        sql_stats.register_owner(self.table, owner.__name__)
+
+    # region: statement builders
+
+    def _statement(self, *shape) -> str:
+        sql = self._statements.get(shape)
+        if sql is None:
+            builder = getattr(self, f"_build_{shape[0]}")
+            sql = self._statements[shape] = builder(*shape[1:])
+        return sql
+
+    def _build_create(self) -> str:
+        definitions = [f"{name} {definition}" for name, definition in self.definitions.items()]
+        if not any("PRIMARY KEY" in d.upper() for d in self.definitions.values()):
+            definitions.append(f"PRIMARY KEY ({', '.join(self.key)})")
+        joined = ",\n  ".join(definitions)
+        return f"CREATE TABLE IF NOT EXISTS {self.table} (\n  {joined}\n);"
+
+    def _build_create_index(self, column: str) -> str:
+        return f"CREATE INDEX IF NOT EXISTS {self.table}_{column}_idx ON {self.table}({column});"
+
+    def _build_select(self, columns: t.Tuple[str, ...], where: t.Tuple[str, ...], extra: str, order_by: str) -> str:
+        sql = f"SELECT {', '.join(columns)} FROM {self.table}"
+        conditions = [f"{c} = ?" for c in where]
+        if extra:
+            conditions.append(f"({extra})")
+        if conditions:
+            sql += f" WHERE {' AND '.join(conditions)}"
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        return f"{sql};"
+
+    def _build_select_in(self, columns: t.Tuple[str, ...], column: str, size: int) -> str:
+        placeholders = ", ".join("?" * size)
+        return f"SELECT {', '.join(columns)} FROM {self.table} WHERE {column} IN ({placeholders});"
+
+    def _build_select_before(self, column: str) -> str:
+        return f"SELECT {', '.join(self.key)} FROM {self.table} WHERE {column} < ? ORDER BY {column} LIMIT ?;"
+
+    def _build_upsert(self, columns: t.Tuple[str, ...]) -> str:
+        placeholders = ", ".join("?" * len(columns))
+        sql = f"INSERT INTO {self.table}({', '.join(columns)}) VALUES ({placeholders}) ON CONFLICT({', '.join(self.key)})"
+        updates = [f"{c}=excluded.{c}" for c in columns if c not in self.key]
+        if updates:
+            return f"{sql} DO UPDATE SET {', '.join(updates)};"
+        return f"{sql} DO NOTHING;"
+
+    def _build_delete(self, where: t.Tuple[str, ...], extra: str) -> str:
+        conditions = [f"{c} = ?" for c in where]
+        if extra:
+            conditions.append(f"({extra})")
+        return f"DELETE FROM {self.table} WHERE {' AND '.join(conditions)};"
+
+    # endregion
+
+    def create(self):
+        """Create the table and its indexes if they don't already exist."""
+        log.info(f"Ensuring table exists: {self.table}")
+        db.backend.execute(self._statement("create"))
+        for column in self.indexes:
+            db.backend.execute(self._statement("create_index", column))
+        db.commit()
+
+    def select(self, *key: t.Any, columns: t.Sequence[str] = None) -> t.Optional[Row]:
+        """Select a single row by its primary key."""
+        if len(key) != len(self.key):
+            raise ValueError(f"Expected {len(self.key)} key values for '{self.table}', got {len(key)}.")
+        sql = self._statement("select", tuple(columns or self.columns), self.key, None, None)
+        return db.backend.fetchone(sql, key)
+
+    def select_one(self, *, columns: t.Sequence[str] = None, **where: t.Any) -> t.Optional[Row]:
+        """Select the first row matching all given column values."""
+        sql = self._statement("select", tuple(columns or self.columns), tuple(where), None, None)
+        return db.backend.fetchone(sql, tuple(where.values()))
+
+    def select_all(
+        self,
+        *,
+        columns: t.Sequence[str] = None,
+        where: str = None,
+        params: t.Sequence[t.Any] = (),
+        order_by: str = None,
+        **equals: t.Any
+    ) -> t.List[Row]:
+        """
+        Select all rows matching the given column values.
+
+        A raw `where` clause with its own `params` can be given for conditions that aren't
+        simple equality, and is combined with any column values given.
+        """
+        sql = self._statement("select", tuple(columns or self.columns), tuple(equals), where, order_by)
+        return db.backend.fetchall(sql, (*equals.values(), *params))
+
+    def select_in(self, column: str, values: t.Iterable[t.Any], *, columns: t.Sequence[str] = None) -> t.List[Row]:
+        """Select all rows where `column` is any of `values`, in as few queries as possible."""
+        columns = tuple(columns or self.columns)
+        values = list(dict.fromkeys(values))
+        rows = []
+        for start in range(0, len(values), self.IN_BATCH_SIZE):
+            batch = values[start:start + self.IN_BATCH_SIZE]
+            sql = self._statement("select_in", columns, column, len(batch))
+            rows.extend(db.backend.fetchall(sql, batch))
+        return rows
+
+    def upsert(self, **values: t.Any):
+        """Insert a row, updating only the given columns if its key already exists."""
+        sql = self._statement("upsert", tuple(values))
+        db.backend.execute(sql, tuple(values.values()))
+        db.commit()
+
+    def upsert_many(self, rows: t.Iterable[Row]):
+        """Upsert many rows with a single statement. All rows must give the same columns."""
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return
+        columns = tuple(first)
+        sql = self._statement("upsert", columns)
+        params = ([row[c] for c in columns] for row in itertools.chain([first], rows))
+        db.backend.executemany(sql, params)
+        db.commit()
+
+    def delete(self, *key: t.Any):
+        """Delete a single row by its primary key."""
+        db.backend.execute(self._statement("delete", self.key, None), key)
+        db.commit()
+
+    def delete_many(self, keys: t.Iterable[t.Sequence[t.Any]]):
+        """Delete many rows by primary key with a single statement."""
+        if len(self.key) == 1:
+            keys = ((k,) if not isinstance(k, (tuple, list)) else k for k in keys)
+        db.backend.executemany(self._statement("delete", self.key, None), keys)
+        db.commit()
+
+    def delete_where(self, *, where: str = None, params: t.Sequence[t.Any] = (), **equals: t.Any):
+        """
+        Delete all rows matching the given column values.
+
+        As with `select_all`, a raw `where` clause with its own `params` can also be given.
+        """
+        if not where and not equals:
+            raise ValueError(f"Refusing to delete all rows from '{self.table}'.")
+        sql = self._statement("delete", tuple(equals), where)
+        db.backend.execute(sql, (*equals.values(), *params))
+        db.commit()
+
+    def prune(self, column: str, before: t.Any, *, limit: int = IN_BATCH_SIZE) -> int:
+        """
+        Delete up to `limit` of the rows with `column` less than `before`, oldest first.
+
+        Returns how many were deleted, so a large prune can be spread over many small
+        calls that each hold the database only briefly.
+        """
+        keys = db.backend.fetchall(self._statement("select_before", column), (before, limit))
+        if keys:
+            self.delete_many([tuple(k) for k in keys])
+        return len(keys)
+
+    # region: async versions, for callers on the event loop
+
+    async def select_async(self, *key: t.Any, columns: t.Sequence[str] = None) -> t.Optional[Row]:
+        if len(key) != len(self.key):
+            raise ValueError(f"Expected {len(self.key)} key values for '{self.table}', got {len(key)}.")
+        sql = self._statement("select", tuple(columns or self.columns), self.key, None, None)
+        return await db.backend.fetchone_async(sql, key)
+
+    async def select_all_async(
+        self,
+        *,
+        columns: t.Sequence[str] = None,
+        where: str = None,
+        params: t.Sequence[t.Any] = (),
+        order_by: str = None,
+        **equals: t.Any
+    ) -> t.List[Row]:
+        sql = self._statement("select", tuple(columns or self.columns), tuple(equals), where, order_by)
+        return await db.backend.fetchall_async(sql, (*equals.values(), *params))
+
+    async def upsert_async(self, **values: t.Any):
+        sql = self._statement("upsert", tuple(values))
+        await db.backend.execute_async(sql, tuple(values.values()))
+        db.commit()
+
+    async def upsert_many_async(self, rows: t.Iterable[Row]):
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return
+        columns = tuple(first)
+        sql = self._statement("upsert", columns)
+        params = [[row[c] for c in columns] for row in itertools.chain([first], rows)]
+        await db.backend.executemany_async(sql, params)
+        db.commit()
+
+    async def delete_async(self, *key: t.Any):
+        await db.backend.execute_async(self._statement("delete", self.key, None), key)
+        db.commit()
+
+    # endregion
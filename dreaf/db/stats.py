@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import bisect
+import logging
+import re
+import time
+import typing as t
+import weakref
+from collections import Counter
+
+from dreaf.context import ctx
+
+log = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"IN \((?:\?, )*\?\)", re.IGNORECASE)
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE(?: IF NOT EXISTS)?)\s+(\w+)", re.IGNORECASE)
+
+
+def template(sql: str) -> str:
+    """Normalise an SQL statement so variations of the same query are counted together."""
+    return _IN_LIST.sub("IN (...)", _WHITESPACE.sub(" ", sql).strip())
+
+
+class Histogram:
+    """Latency counts in fixed buckets, with the total and worst case."""
+
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, float("inf"))
+
+    def __init__(self):
+        self.buckets = [0] * len(self.BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.buckets[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, pct: float) -> float:
+        """The upper bound of the bucket the given percentile falls in."""
+        target = self.count * pct / 100
+        seen = 0
+        for bound, count in zip(self.BUCKETS, self.buckets):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+class SQLStats:
+    """
+    Per statement template and per table timings for every query run.
+
+    Statements slower than `slow_threshold` seconds are logged along with the command or
+    event that ran them. A template run `repeat_threshold` times within a single command is
+    logged once as a likely N+1 query.
+    """
+
+    def __init__(self, *, slow_threshold: float = 0.1, repeat_threshold: int = 10):
+        self.slow_threshold = slow_threshold
+        self.repeat_threshold = repeat_threshold
+        self.templates: t.Dict[str, Histogram] = dict()
+        self.tables: t.Dict[str, Histogram] = dict()
+        self.slow = 0
+        self.repeats: Counter = Counter()
+        self._owners: t.Dict[str, str] = dict()
+        self._per_command: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def register_owner(self, table: str, owner: str):
+        """Attribute statements on `table` to the `db.Table` subclass that owns it."""
+        self._owners[table] = owner
+
+    def reset(self):
+        self.templates.clear()
+        self.tables.clear()
+        self.slow = 0
+        self.repeats.clear()
+
+    def record(self, sql: str, seconds: float):
+        key = template(sql)
+        self.templates.setdefault(key, Histogram()).observe(seconds)
+
+        match = _TABLE.search(key)
+        table = match.group(1) if match else key.split(" ", 1)[0].upper()
+        self.tables.setdefault(self._owners.get(table, table), Histogram()).observe(seconds)
+
+        cmd_ctx = ctx.cmd_ctx
+        source = f"command '{cmd_ctx.command}'" if cmd_ctx else f"event '{ctx.event}'" if ctx.event else "startup"
+
+        if seconds >= self.slow_threshold:
+            self.slow += 1
+            log.warning(f"Slow query in {source} took {seconds * 1000:.1f}ms: {key}")
+
+        if cmd_ctx:
+            counts = self._per_command.setdefault(cmd_ctx, Counter())
+            counts[key] += 1
+            if counts[key] == self.repeat_threshold:
+                self.repeats[(str(cmd_ctx.command), key)] += 1
+                log.warning(f"Query run {self.repeat_threshold} times in {source}, possible N+1: {key}")
+
+    def timed(self, sql: str) -> _Timer:
+        return _Timer(self, sql)
+
+
+class _Timer:
+    __slots__ = ("stats", "sql", "start")
+
+    def __init__(self, stats: SQLStats, sql: str):
+        self.stats = stats
+        self.sql = sql
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.stats.record(self.sql, time.perf_counter() - self.start)
+
+
+class InstrumentedConnection:
+    """Wraps an sqlite3 connection, timing every statement it runs."""
+
+    def __init__(self, conn, stats: SQLStats):
+        self._conn = conn
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __repr__(self):
+        return f"<InstrumentedConnection {self._conn!r}>"
+
+    def execute(self, sql: str, params: t.Sequence[t.Any] = ()):
+        with self._stats.timed(sql):
+            return self._conn.execute(sql, params)
+
+    def executemany(self, sql: str, params: t.Iterable[t.Sequence[t.Any]]):
+        with self._stats.timed(sql):
+            return self._conn.executemany(sql, params)
+
+    def commit(self):
+        with self._stats.timed("COMMIT"):
+            self._conn.commit()
+
+
+sql_stats = SQLStats()
@@ -13,7 +13,7 @@ log = logging.getLogger(__name__)
 data_path = Path("data/")
 
 
-class Ascension(db.Table):
+class Ascension(db.Table, catalogue=True):
     default_data = data_path / "ascensions.csv"
     cache = dict()
 
@@ -53,7 +53,7 @@ class Ascension(db.Table):
 
     @staticmethod
     def _select(name):
-        cursor = db.conn.execute(
+        cursor = db.catalogue.conn.execute(
             """
             SELECT name, level_cap, aliases
             FROM ascensions
@@ -67,7 +67,7 @@ class Ascension(db.Table):
 
     @staticmethod
     def _select_all():
-        cursor = db.conn.execute(
+        cursor = db.catalogue.conn.execute(
             """
             SELECT name, level_cap, aliases
             FROM ascensions
@@ -79,21 +79,20 @@ class Ascension(db.Table):
         return data
 
     @staticmethod
-    def _delete(name):
-        cursor = db.conn.execute(
+    def _delete(conn, name):
+        cursor = conn.execute(
             """
             DELETE FROM ascensions
             WHERE name = ?;
             """,
             [name]
         )
-        db.conn.commit()
         cursor.close()
         log.info(f"Ascension '{name}' deleted from table.")
 
     @staticmethod
-    def _insert(name, level_cap, aliases):
-        cursor = db.conn.execute(
+    def _insert(conn, name, level_cap, aliases):
+        cursor = conn.execute(
             """
             INSERT INTO ascensions(name, level_cap, aliases)
               VALUES (?, ?, ?)
@@ -104,21 +103,20 @@ class Ascension(db.Table):
             """,
             [name, level_cap, aliases]
         )
-        db.conn.commit()
         cursor.close()
         log.info(f"Ascension '{name}' inserted to table.")
 
     @classmethod
-    def load_default_data(cls):
+    def load_default_data(cls, conn):
         with cls.default_data.open("r") as f:
             data = csv.DictReader(f)
             for entry in data:
-                cls._insert(**entry)
+                cls._insert(conn, **entry)
 
     @classmethod
-    def _create_table(cls):
+    def _create_table(cls, conn):
         try:
-            cursor = db.conn.execute(
+            cursor = conn.execute(
                 """
                 CREATE TABLE ascensions (
                   name TEXT PRIMARY KEY COLLATE nocase,
@@ -129,7 +127,7 @@ class Ascension(db.Table):
             )
             cursor.close()
             log.info(f"'ascensions' table created. Loading default data.")
-            cls.load_default_data()
+            cls.load_default_data(conn)
             log.info(f"'ascensions' table default data loaded.")
         except sqlite3.OperationalError:
             return
@@ -10,7 +10,7 @@ log = logging.getLogger(__name__)
 data_path = Path("data/")
 
 
-class HeroClass(db.Table):
+class HeroClass(db.Table, catalogue=True):
     default_data = data_path / "hero_classes.csv"
     cache = dict()
 
@@ -33,7 +33,7 @@ class HeroClass(db.Table):
 
     @staticmethod
     def _select(name):
-        cursor = db.conn.execute(
+        cursor = db.catalogue.conn.execute(
             """
             SELECT name, blessing
             FROM hero_classes
@@ -47,7 +47,7 @@ class HeroClass(db.Table):
 
     @staticmethod
     def _select_all():
-        cursor = db.conn.execute(
+        cursor = db.catalogue.conn.execute(
             """
             SELECT name, blessing
             FROM hero_classes
@@ -59,21 +59,20 @@ class HeroClass(db.Table):
         return data
 
     @staticmethod
-    def _delete(name):
-        cursor = db.conn.execute(
+    def _delete(conn, name):
+        cursor = conn.execute(
             """
             DELETE FROM ascensions
             WHERE name = ?;
             """,
             [name]
         )
-        db.conn.commit()
         cursor.close()
         log.info(f"HeroClass '{name}' deleted from table.")
 
     @staticmethod
-    def _insert(name, blessing):
-        cursor = db.conn.execute(
+    def _insert(conn, name, blessing):
+        cursor = conn.execute(
             """
             INSERT INTO hero_classes(name, blessing)
               VALUES (?, ?)
@@ -83,21 +82,20 @@ class HeroClass(db.Table):
             """,
             [name, blessing]
         )
-        db.conn.commit()
         cursor.close()
         log.info(f"HeroClass '{name}' inserted to table.")
 
     @classmethod
-    def load_default_data(cls):
+    def load_default_data(cls, conn):
         with cls.default_data.open("r") as f:
             data = csv.DictReader(f)
             for entry in data:
-                cls._insert(**entry)
+                cls._insert(conn, **entry)
 
     @classmethod
-    def _create_table(cls):
+    def _create_table(cls, conn):
         try:
-            cursor = db.conn.execute(
+            cursor = conn.execute(
                 """
                 CREATE TABLE hero_classes (
                   name TEXT PRIMARY KEY COLLATE nocase,
@@ -107,7 +105,7 @@ class HeroClass(db.Table):
             )
             cursor.close()
             log.info(f"'hero_classes' table created. Loading default data.")
-            cls.load_default_data()
+            cls.load_default_data(conn)
             log.info(f"'hero_classes' table default data loaded.")
         except sqlite3.OperationalError:
             return
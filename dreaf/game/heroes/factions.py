@@ -15,7 +15,7 @@ log = logging.getLogger(__name__)
 data_path = Path("data/")
 
 
-class Faction(db.Table):
+class Faction(db.Table, catalogue=True):
     default_data = data_path / "factions.csv"
     factions = dict()
 
@@ -71,7 +71,7 @@ class Faction(db.Table):
 
     @staticmethod
     def _select(name):
-        cursor = db.conn.execute(
+        cursor = db.catalogue.conn.execute(
             """
             SELECT name, emblem_cap, aliases
             FROM factions
@@ -85,7 +85,7 @@ class Faction(db.Table):
 
     @staticmethod
     def _select_all():
-        cursor = db.conn.execute(
+        cursor = db.catalogue.conn.execute(
             """
             SELECT name, emblem_cap, aliases
             FROM factions
@@ -97,21 +97,20 @@ class Faction(db.Table):
         return data
 
     @staticmethod
-    def _delete(name):
-        cursor = db.conn.execute(
+    def _delete(conn, name):
+        cursor = conn.execute(
             """
             DELETE FROM factions
             WHERE name = ?;
             """,
             [name]
         )
-        db.conn.commit()
         cursor.close()
         log.info(f"Faction '{name}' deleted from table.")
 
     @staticmethod
-    def _insert(name, emblem_cap, aliases):
-        cursor = db.conn.execute(
+    def _insert(conn, name, emblem_cap, aliases):
+        cursor = conn.execute(
             """
             INSERT INTO factions(name, emblem_cap, aliases)
               VALUES (?, ?, ?)
@@ -122,21 +121,20 @@ class Faction(db.Table):
             """,
             [name, emblem_cap, aliases]
         )
-        db.conn.commit()
         cursor.close()
         log.info(f"Faction '{name}' inserted to table.")
 
     @classmethod
-    def load_default_data(cls):
+    def load_default_data(cls, conn):
         with cls.default_data.open("r") as f:
             data = csv.DictReader(f)
             for entry in data:
-                cls._insert(**entry)
+                cls._insert(conn, **entry)
 
     @classmethod
-    def _create_table(cls):
+    def _create_table(cls, conn):
         try:
-            cursor = db.conn.execute(
+            cursor = conn.execute(
                 """
                 CREATE TABLE factions (
                   name TEXT PRIMARY KEY COLLATE nocase,
@@ -147,7 +145,7 @@ class Faction(db.Table):
             )
             cursor.close()
             log.info(f"'factions' table created. Loading default data.")
-            cls.load_default_data()
+            cls.load_default_data(conn)
             log.info(f"'factions' table default data loaded.")
         except sqlite3.OperationalError:
             return
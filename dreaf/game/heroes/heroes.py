@@ -23,7 +23,7 @@ log = logging.getLogger(__name__)
 data_path = Path("data/")
 
 
-class Hero(db.Table):
+class Hero(db.Table, catalogue=True):
     default_data = data_path / "heroes.csv"
     cache = dict()
     heroes = dict()
@@ -198,17 +198,17 @@ class Hero(db.Table):
         return [cls.from_data(h) for h in cls._select_tier(tier.name.casefold(), cele, hypo, dim, std)]
 
     @classmethod
-    def load_default_data(cls):
+    def load_default_data(cls, conn):
         with cls.default_data.open("r") as f:
             data = csv.DictReader(f)
             for entry in data:
-                cls._insert(**entry)
+                cls._insert(conn, **entry)
 
     # region: SQL methods
 
     @staticmethod
     def _select(name):
-        cursor = db.conn.execute(
+        cursor = db.catalogue.conn.execute(
             """
             SELECT name, faction, tier, type, class, primary_role, secondary_role
             FROM heroes
@@ -249,7 +249,7 @@ class Hero(db.Table):
         if not factions:
             return []
 
-        cursor = db.conn.execute(
+        cursor = db.catalogue.conn.execute(
             f"""
             SELECT name, faction, tier, type, class, primary_role, secondary_role
             FROM heroes
@@ -266,7 +266,7 @@ class Hero(db.Table):
 
     @staticmethod
     def _select_all():
-        cursor = db.conn.execute(
+        cursor = db.catalogue.conn.execute(
             """
             SELECT name, faction, tier, type, class, primary_role, secondary_role
             FROM heroes
@@ -278,8 +278,8 @@ class Hero(db.Table):
         return data
 
     @staticmethod
-    def _insert(name, faction, tier, hero_type, hero_class, primary_role, secondary_role):
-        cursor = db.conn.execute(
+    def _insert(conn, name, faction, tier, hero_type, hero_class, primary_role, secondary_role):
+        cursor = conn.execute(
             """
             INSERT INTO heroes(name, faction, tier, type, class, primary_role, secondary_role)
               VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -294,27 +294,25 @@ class Hero(db.Table):
             """,
             [name, faction, tier, hero_type, hero_class, primary_role, secondary_role]
         )
-        db.conn.commit()
         cursor.close()
         log.info(f"Hero '{name}' inserted to table.")
 
     @staticmethod
-    def _delete(name):
-        cursor = db.conn.execute(
+    def _delete(conn, name):
+        cursor = conn.execute(
             """
             DELETE FROM heroes
             WHERE name = ?;
             """,
             [name]
         )
-        db.conn.commit()
         cursor.close()
         log.info(f"Hero '{name}' deleted from table.")
 
     @classmethod
-    def _create_table(cls):
+    def _create_table(cls, conn):
         try:
-            cursor = db.conn.execute(
+            cursor = conn.execute(
                 """
                 CREATE TABLE heroes (
                   name TEXT PRIMARY KEY COLLATE nocase,
@@ -329,7 +327,7 @@ class Hero(db.Table):
             )
             cursor.close()
             log.info(f"'heroes' table created. Loading default data.")
-            cls.load_default_data()
+            cls.load_default_data(conn)
             log.info(f"'heroes' table default data loaded.")
         except sqlite3.OperationalError:
             return
@@ -11,7 +11,7 @@ log = logging.getLogger(__name__)
 data_path = Path("data/")
 
 
-class HeroTier(db.Table):
+class HeroTier(db.Table, catalogue=True):
     default_data = data_path / "hero_tiers.csv"
     cache = dict()
 
@@ -47,7 +47,7 @@ class HeroTier(db.Table):
 
     @staticmethod
     def _select(name):
-        cursor = db.conn.execute(
+        cursor = db.catalogue.conn.execute(
             """
             SELECT name, min_ascension, max_ascension
             FROM hero_tiers
@@ -61,7 +61,7 @@ class HeroTier(db.Table):
 
     @staticmethod
     def _select_all():
-        cursor = db.conn.execute(
+        cursor = db.catalogue.conn.execute(
             """
             SELECT name, min_ascension, max_ascension
             FROM hero_tiers
@@ -73,21 +73,20 @@ class HeroTier(db.Table):
         return data
 
     @staticmethod
-    def _delete(name):
-        cursor = db.conn.execute(
+    def _delete(conn, name):
+        cursor = conn.execute(
             """
             DELETE FROM hero_tiers
             WHERE name = ?;
             """,
             [name]
         )
-        db.conn.commit()
         cursor.close()
         log.info(f"HeroTier '{name}' deleted from table.")
 
     @staticmethod
-    def _insert(name, min_ascension, max_ascension):
-        cursor = db.conn.execute(
+    def _insert(conn, name, min_ascension, max_ascension):
+        cursor = conn.execute(
             """
             INSERT INTO hero_tiers(name, min_ascension, max_ascension)
               VALUES (?, ?, ?)
@@ -98,21 +97,20 @@ class HeroTier(db.Table):
             """,
             [name, min_ascension, max_ascension]
         )
-        db.conn.commit()
         cursor.close()
         log.info(f"HeroTier '{name}' inserted to table.")
 
     @classmethod
-    def load_default_data(cls):
+    def load_default_data(cls, conn):
         with cls.default_data.open("r") as f:
             data = csv.DictReader(f)
             for entry in data:
-                cls._insert(**entry)
+                cls._insert(conn, **entry)
 
     @classmethod
-    def _create_table(cls):
+    def _create_table(cls, conn):
         try:
-            cursor = db.conn.execute(
+            cursor = conn.execute(
                 """
                 CREATE TABLE hero_tiers (
                   name TEXT PRIMARY KEY COLLATE nocase,
@@ -123,7 +121,7 @@ class HeroTier(db.Table):
             )
             cursor.close()
             log.info(f"'hero_tiers' table created. Loading default data.")
-            cls.load_default_data()
+            cls.load_default_data(conn)
             log.info(f"'hero_tiers' table default data loaded.")
         except sqlite3.OperationalError:
             return
@@ -10,7 +10,7 @@ log = logging.getLogger(__name__)
 data_path = Path("data/")
 
 
-class HeroType(db.Table):
+class HeroType(db.Table, catalogue=True):
     default_data = data_path / "hero_types.csv"
     cache = dict()
 
@@ -29,7 +29,7 @@ class HeroType(db.Table):
 
     @staticmethod
     def _select(name):
-        cursor = db.conn.execute(
+        cursor = db.catalogue.conn.execute(
             """
             SELECT name
             FROM hero_types
@@ -43,7 +43,7 @@ class HeroType(db.Table):
 
     @staticmethod
     def _select_all():
-        cursor = db.conn.execute(
+        cursor = db.catalogue.conn.execute(
             """
             SELECT name
             FROM hero_types
@@ -55,21 +55,20 @@ class HeroType(db.Table):
         return data
 
     @staticmethod
-    def _delete(name):
-        cursor = db.conn.execute(
+    def _delete(conn, name):
+        cursor = conn.execute(
             """
             DELETE FROM hero_types
             WHERE name = ?;
             """,
             [name]
         )
-        db.conn.commit()
         cursor.close()
         log.info(f"HeroType '{name}' deleted from table.")
 
     @staticmethod
-    def _insert(name):
-        cursor = db.conn.execute(
+    def _insert(conn, name):
+        cursor = conn.execute(
             """
             INSERT INTO hero_types(name) VALUES (?)
             ON CONFLICT(name)
@@ -77,21 +76,20 @@ class HeroType(db.Table):
             """,
             [name]
         )
-        db.conn.commit()
         cursor.close()
         log.info(f"HeroType '{name}' inserted to table.")
 
     @classmethod
-    def load_default_data(cls):
+    def load_default_data(cls, conn):
         with cls.default_data.open("r") as f:
             data = csv.DictReader(f)
             for entry in data:
-                cls._insert(**entry)
+                cls._insert(conn, **entry)
 
     @classmethod
-    def _create_table(cls):
+    def _create_table(cls, conn):
         try:
-            cursor = db.conn.execute(
+            cursor = conn.execute(
                 """
                 CREATE TABLE hero_types (
                   name TEXT PRIMARY KEY COLLATE nocase
@@ -100,7 +98,7 @@ class HeroType(db.Table):
             )
             cursor.close()
             log.info(f"'hero_types' table created. Loading default data.")
-            cls.load_default_data()
+            cls.load_default_data(conn)
             log.info(f"'hero_types' table default data loaded.")
         except sqlite3.OperationalError:
             return
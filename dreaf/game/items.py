@@ -5,6 +5,16 @@ from dreaf import db
 
 
 class Item(db.Table):
+    _repo = db.Repository(
+        "items",
+        {
+            "name": "TEXT PRIMARY KEY",
+            "description": "TEXT NULL",
+            "emoji_id": "INT NULL",
+        },
+        key="name",
+    )
+
     def __init__(self, name: str, description: str, emoji_id: int = None):
         self.name = name
         self.description = description
@@ -73,89 +83,28 @@ class Item(db.Table):
 
     @staticmethod
     def _select(name):
-        cursor = db.conn.execute(
-            """
-            SELECT name, description, emoji_id
-            FROM items
-            WHERE name = ?;
-            """,
-            [name]
-        )
-        data = cursor.fetchone()
-        cursor.close()
-        return data
+        return Item._repo.select(name)
 
     @staticmethod
     def _select_by_emoji_id(emoji_id):
-        cursor = db.conn.execute(
-            """
-            SELECT name, description, emoji_id
-            FROM items
-            WHERE emoji_id = ?;
-            """,
-            [emoji_id]
-        )
-        data = cursor.fetchone()
-        cursor.close()
-        return data
+        return Item._repo.select_one(emoji_id=emoji_id)
 
     @staticmethod
     def _select_all(match_name: str):
         if match_name:
-            cursor = db.conn.execute(
-                """
-                SELECT name, description, emoji_id
-                FROM items
-                WHERE name LIKE ?
-                ORDER BY name;
-                """,
-                [f"%{match_name.casefold()}%"]
-            )
-        else:
-            cursor = db.conn.execute("SELECT name, description, emoji_id FROM items ORDER BY name;")
-
-        data = cursor.fetchall()
-        cursor.close()
-        return data
+            return Item._repo.select_all(where="name LIKE ?", params=[f"%{match_name.casefold()}%"], order_by="name")
+        return Item._repo.select_all(order_by="name")
 
     @staticmethod
     def _insert(name, description, emoji_id):
-        cursor = db.conn.execute(
-            """
-            INSERT INTO items(name, description, emoji_id) VALUES (?, ?, ?)
-            ON CONFLICT(name)
-            DO UPDATE SET
-              description=excluded.description,
-              emoji_id=excluded.emoji_id;
-            """,
-            [name, description, emoji_id]
-        )
-        db.conn.commit()
-        cursor.close()
+        Item._repo.upsert(name=name, description=description, emoji_id=emoji_id)
 
     @staticmethod
     def _delete(name):
-        cursor = db.conn.execute(
-            """
-            DELETE FROM items
-            WHERE name = ?
-            """,
-            [name]
-        )
-        db.conn.commit()
-        cursor.close()
+        Item._repo.delete(name)
 
-    @staticmethod
-    def _create_table():
-        cursor = db.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS items (
-              name TEXT PRIMARY KEY,
-              description TEXT NULL,
-              emoji_id INT NULL
-            );
-            """
-        )
-        cursor.close()
+    @classmethod
+    def _create_table(cls):
+        cls._repo.create()
 
     # endregion
@@ -1,6 +1,8 @@
 from .model import GiftCode
 from .commands import GiftCodeCommands
+from .redeem_session import init_sessions
 
 
 def setup(bot):
+    init_sessions()
     bot.add_cog(GiftCodeCommands(bot))
@@ -13,6 +13,7 @@ from . import redeem_session
 from .model import GiftCode
 from .redeem_session import RedeemSession, SessionExpired
 from .. import checks, constants
+from ..db.keyvalue import kv
 from ..items.model import Item
 from ..players import Player
 
@@ -24,6 +25,8 @@ log = logging.getLogger(__name__)
 AFK_FEED_CODE_PATTERN = re.compile(r".?```\s*(\w+[^\s]\w+)\s*```")
 AFK_FEED_DATETIME_PATTERN = re.compile(r"(\d\d\d\d/\d\d/\d\d \d\d:\d\d:\d\d) UTC")
 
+bot_globals = kv.namespace("globals", int)
+
 
 class GiftReward:
     @classmethod
@@ -53,15 +56,6 @@ class GiftCodeCommands(commands.Cog, name="Gift Codes"):
         task = bot.loop.create_task(self.update_code_message())
         task.add_done_callback(self.task_error)
 
-    @property
-    def code_message_id(self):
-        m_id = constants.persistent_globals.get("code_message_id")
-        return int(m_id) if m_id else None
-
-    @code_message_id.setter
-    def code_message_id(self, value):
-        constants.persistent_globals["code_message_id"] = value
-
     async def update_code_message(self):
         await self.bot.wait_until_ready()
         channel = self.bot.get_channel(constants.CODE_CHANNEL)
@@ -69,28 +63,31 @@ class GiftCodeCommands(commands.Cog, name="Gift Codes"):
             log.warning("Code channel not found.")
             return
 
-        message_id = self.code_message_id
+        message_id = await bot_globals.get("code_message_id")
         embed = self.code_list_embed(GiftCode.get_all(), global_list=True)
 
         if not message_id:
             log.info("Code message ID not found.")
-            await self.create_code_message(channel, embed)
+            await self.create_code_message(channel, embed, replaces=None)
             return
 
         try:
             message: discord.Message = await channel.fetch_message(message_id)
         except discord.NotFound:
-            await self.create_code_message(channel, embed)
+            await self.create_code_message(channel, embed, replaces=message_id)
         else:
             await message.edit(embed=embed)
             await message.add_reaction(self._gift_emoji)
 
-    async def create_code_message(self, channel, embed):
+    async def create_code_message(self, channel, embed, *, replaces: t.Optional[int]):
         log.info("Creating new message.")
         message: discord.Message = await channel.send(embed=embed)
+        if not await bot_globals.compare_and_set("code_message_id", replaces, message.id):
+            # another task already replaced the old message while this one was being sent
+            log.info("Code message was already replaced, removing duplicate.")
+            await message.delete()
+            return
         await message.add_reaction(self._gift_emoji)
-        self.code_message_id = message.id
-        return
 
     @commands.group(invoke_without_command=True)
     async def code(self, ctx, code: GiftCode):
@@ -389,7 +386,8 @@ class GiftCodeCommands(commands.Cog, name="Gift Codes"):
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
         """Detect gift reaction on codes message to start redemptions."""
-        if payload.message_id != self.code_message_id:
+        code_message_id = await bot_globals.get("code_message_id")
+        if payload.message_id != code_message_id:
             return
         if payload.emoji.name != self._gift_emoji:
             return
@@ -399,7 +397,7 @@ class GiftCodeCommands(commands.Cog, name="Gift Codes"):
         log.info(f"{payload.member} used gift redemption reaction.")
         log_channel = self.bot.guild.get_channel(constants.CODE_LOGS_CHANNEL)
 
-        await self.bot.http.remove_reaction(constants.CODE_CHANNEL, self.code_message_id, payload.emoji.name, payload.user_id)
+        await self.bot.http.remove_reaction(constants.CODE_CHANNEL, code_message_id, payload.emoji.name, payload.user_id)
 
         try:
             codes = GiftCode.get_all()
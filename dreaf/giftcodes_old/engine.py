@@ -0,0 +1,108 @@
+"""
+Redeems gift codes for many players at once without flooding the cdkey API.
+
+Each (player, code) pair is a job. A redemption gets a few workers that take jobs from
+its queue, so no more than `per_account` requests are made for one account at a time,
+and no more than `concurrency` across every redemption running. Results are yielded as
+soon as they finish rather than all at the end.
+
+How fast requests are actually sent is paced separately, by each endpoint's limiter, and
+each HTTP attempt has its own timeout in the session, so waiting on the limiter never
+counts against it.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import typing as t
+import weakref
+
+from dreaf import constants
+
+if t.TYPE_CHECKING:
+    from dreaf.players import Player
+    from .model import GiftCode
+    from .redeem_session import RedeemSession
+
+log = logging.getLogger(__name__)
+
+
+class Redemption(t.NamedTuple):
+    """The outcome of redeeming one code for one player, with the error if it failed."""
+    player: Player
+    code: GiftCode
+    error: t.Optional[BaseException] = None
+
+
+class RedemptionEngine:
+    """Limits how many redemption requests run at once, overall and for each account."""
+
+    def __init__(
+        self,
+        *,
+        concurrency: int = constants.REDEEM_CONCURRENCY,
+        per_account: int = constants.REDEEM_PER_ACCOUNT,
+    ):
+        self.concurrency = concurrency
+        self.per_account = per_account
+        self._slots: t.Optional[asyncio.Semaphore] = None
+        # an account's semaphore goes once no job holds it, which is when no permits are taken
+        self._accounts: t.MutableMapping[int, asyncio.Semaphore] = weakref.WeakValueDictionary()
+
+    def __repr__(self):
+        return f"<RedemptionEngine concurrency={self.concurrency} per_account={self.per_account}>"
+
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        # made on first use so it belongs to the running event loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        return self._slots
+
+    def account(self, game_id: int) -> asyncio.Semaphore:
+        semaphore = self._accounts.get(game_id)
+        if semaphore is None:
+            semaphore = self._accounts[game_id] = asyncio.Semaphore(self.per_account)
+        return semaphore
+
+    async def redeem(
+        self,
+        session: RedeemSession,
+        jobs: t.Iterable[t.Tuple[Player, GiftCode]],
+        *,
+        force: bool = False,
+    ) -> t.AsyncIterator[Redemption]:
+        """Redeem each (player, code) job through the session, yielding results as they finish."""
+        queue: asyncio.Queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+        total = queue.qsize()
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def work():
+            while not queue.empty():
+                player, code = queue.get_nowait()
+                results.put_nowait(await self._redeem(session, player, code, force))
+
+        loop = asyncio.get_running_loop()
+        workers = [loop.create_task(work()) for _ in range(min(self.per_account, total))]
+        try:
+            for _ in range(total):
+                yield await results.get()
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def _redeem(self, session: RedeemSession, player: Player, code: GiftCode, force: bool) -> Redemption:
+        async with self.account(session.game_id), self.slots:
+            try:
+                await session._redeem_code(code, specific_id=player.game_id, force=force)
+            except asyncio.TimeoutError as e:
+                log.warning(f"Redeeming {code} for {player.game_id} timed out.")
+                return Redemption(player, code, e)
+            except Exception as e:
+                return Redemption(player, code, e)
+        return Redemption(player, code)
+
+
+engine = RedemptionEngine()
@@ -0,0 +1,96 @@
+"""
+Request pacing for the Lilith cdkey API.
+
+Each endpoint has a token bucket, and callers wait in turn for a token rather than being
+turned away. The rate adapts to how the API responds: every rejection, whether a 429, a
+5xx or a "too often" error, halves it, and each success raises it a little back toward
+its limit. Each endpoint also has a circuit breaker, so an outage stops a storm of
+consume requests instead of having every one of them time out.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import typing as t
+
+from dreaf.breaker import Breakers
+
+log = logging.getLogger(__name__)
+
+
+class AdaptiveLimiter:
+    """A token bucket whose rate backs off on rejections and recovers on successes."""
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        rate: float,
+        burst: int = 1,
+        min_rate: float = None,
+        increase: float = None,
+        decrease: float = 0.5,
+    ):
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate or rate / 16
+        self.increase = increase or rate / 10
+        self.decrease = decrease
+        self.waiting = 0
+        self.rejections = 0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock: t.Optional[asyncio.Lock] = None
+
+    def __repr__(self):
+        return f"<AdaptiveLimiter '{self.name}' rate={self.rate:.2f}/s waiting={self.waiting}>"
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._tokens + (now - self._updated) * self.rate, self.burst)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait for a request to be allowed, in the order callers arrived."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        self.waiting += 1
+        try:
+            async with self._lock:
+                self._refill()
+                if self._tokens < 1:
+                    await asyncio.sleep((1 - self._tokens) / self.rate)
+                    self._refill()
+                self._tokens -= 1
+        finally:
+            self.waiting -= 1
+
+    def rejected(self):
+        self.rejections += 1
+        self.rate = max(self.rate * self.decrease, self.min_rate)
+        # the next request waits a full interval at the new rate
+        self._refill()
+        self._tokens = min(self._tokens, 0.0)
+        log.info(f"Lilith endpoint '{self.name}' pushed back, slowing to {self.rate:.2f} requests/s.")
+
+    def succeeded(self):
+        self.rate = min(self.rate + self.increase, self.max_rate)
+
+    def status(self) -> t.Dict[str, t.Any]:
+        return {"rate": self.rate, "waiting": self.waiting, "rejections": self.rejections}
+
+
+# requests a second each endpoint starts at, and may burst to
+LIMITS = {
+    "send-mail": dict(rate=0.2, burst=1),
+    "verify-code": dict(rate=1, burst=2),
+    "verify-afk-code": dict(rate=1, burst=2),
+    "cd-key/consume": dict(rate=5, burst=5),
+    "users": dict(rate=1, burst=2),
+}
+
+limiters = {endpoint: AdaptiveLimiter(endpoint, **limits) for endpoint, limits in LIMITS.items()}
+breakers = Breakers("lilith")
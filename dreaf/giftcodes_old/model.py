@@ -9,11 +9,39 @@ from discord.ext import commands
 
 from dreaf import db
 from dreaf.items.model import Item
+from .redeemed import RedeemedIndex
 
 log = logging.getLogger(__name__)
 
 
 class GiftCode(db.Table):
+    _codes = db.Repository(
+        "codes",
+        {
+            "code": "TEXT PRIMARY KEY",
+            "expiry": "INT NULL",
+            "posted": "BOOLEAN default FALSE",
+        },
+        key="code",
+    )
+    _rewards_table = db.Repository(
+        "code_rewards",
+        {
+            "code": "TEXT NOT NULL",
+            "reward": "TEXT NOT NULL",
+            "qty": "INT NOT NULL",
+        },
+        key=("code", "reward"),
+    )
+    _redeemed = db.Repository(
+        "redeemed_codes",
+        {
+            "player_id": "INT NOT NULL",
+            "code": "TEXT NOT NULL",
+        },
+        key=("player_id", "code"),
+    )
+    _redeemed_index = RedeemedIndex(_redeemed)
 
     def __init__(self, code: str, expiry: t.Optional[int] = None):
         self.code = code.casefold()
@@ -68,11 +96,15 @@ class GiftCode(db.Table):
         return bool(self.get(self.code))
 
     def is_redeemed(self, user_id: int) -> bool:
-        redeemed = self._select_redeemed(user_id, self.code)
-        return bool(redeemed)
+        return self._redeemed_index.is_redeemed(user_id, self.code)
 
     def mark_redeemed(self, user_id: int):
-        self._insert_redeemed(user_id, self.code)
+        self._redeemed_index.mark(user_id, self.code)
+
+    @classmethod
+    def outstanding(cls, user_id: int, codes: t.Sequence[GiftCode]) -> t.List[GiftCode]:
+        """The codes the user hasn't redeemed yet."""
+        return cls._redeemed_index.outstanding(user_id, codes)
 
     def add_reward(self, item: Item, qty: int):
         self._rewards[item] = qty
@@ -135,150 +167,42 @@ class GiftCode(db.Table):
 
     @staticmethod
     def _select(code):
-        cursor = db.conn.execute(
-            """
-            SELECT code, expiry, posted
-            FROM codes
-            WHERE code = ?;
-            """,
-            [code.casefold()]
-        )
-        data = cursor.fetchone()
-        cursor.close()
-        return data
+        return GiftCode._codes.select(code.casefold())
 
     @staticmethod
     def _select_all(include_expired=False):
         if include_expired:
-            cursor = db.conn.execute("SELECT code, expiry, posted FROM codes")
-        else:
-            cursor = db.conn.execute(
-                """
-                SELECT code, expiry, posted
-                FROM codes
-                WHERE expiry > ? OR expiry IS NULL;
-                """,
-                [int(pendulum.now().timestamp())]
-            )
-        data = cursor.fetchall()
-        cursor.close()
-        return data
-
-    @staticmethod
-    def _select_rewards(code: str):
-        cursor = db.conn.execute(
-            """
-            SELECT reward, qty
-            FROM code_rewards
-            WHERE code = ?;
-            """,
-            [code.casefold()]
+            return GiftCode._codes.select_all()
+        return GiftCode._codes.select_all(
+            where="expiry > ? OR expiry IS NULL",
+            params=[int(pendulum.now().timestamp())],
         )
-        data = cursor.fetchall()
-        cursor.close()
-        return data
 
     @staticmethod
-    def _select_redeemed(player_id: int, code: str):
-        cursor = db.conn.execute(
-            """
-            SELECT code
-            FROM redeemed_codes
-            WHERE player_id = ? AND code = ?;
-            """,
-            [player_id, code.casefold()]
-        )
-        data = cursor.fetchone()
-        cursor.close()
-        return data
+    def _select_rewards(code: str):
+        return GiftCode._rewards_table.select_all(columns=("reward", "qty"), code=code.casefold())
 
     @staticmethod
     def _insert(code: str, expiry: int, posted: bool = False):
-        cursor = db.conn.execute(
-            """
-            INSERT INTO codes(code, expiry, posted) VALUES (?, ?, ?)
-            ON CONFLICT(code)
-            DO UPDATE SET
-              expiry=excluded.expiry,
-              posted=excluded.posted
-            """,
-            [code.casefold(), expiry, posted]
-        )
-        db.conn.commit()
-        cursor.close()
+        GiftCode._codes.upsert(code=code.casefold(), expiry=expiry, posted=posted)
 
     @staticmethod
     def _delete(code: str):
-        cursor = db.conn.execute("DELETE FROM codes WHERE code = ?;", [code.casefold()])
-        db.conn.commit()
-        cursor.close()
+        GiftCode._codes.delete(code.casefold())
 
     @staticmethod
     def _insert_reward(code: str, reward: str, qty: int):
-        cursor = db.conn.execute(
-            """
-            INSERT INTO code_rewards(code, reward, qty) VALUES (?, ?, ?)
-            ON CONFLICT(code, reward)
-            DO UPDATE SET
-              qty=excluded.qty
-            """,
-            [code.casefold(), reward, qty]
-        )
-        db.conn.commit()
-        cursor.close()
+        GiftCode._rewards_table.upsert(code=code.casefold(), reward=reward, qty=qty)
 
     @staticmethod
     def _delete_reward(code: str, reward: str):
-        cursor = db.conn.execute("DELETE FROM code_rewards WHERE code = ? AND reward = ?;", [code.casefold(), reward])
-        db.conn.commit()
-        cursor.close()
+        GiftCode._rewards_table.delete(code.casefold(), reward)
 
-    @staticmethod
-    def _insert_redeemed(player_id: int, code: str):
-        cursor = db.conn.execute(
-            """
-            INSERT INTO redeemed_codes(player_id, code) VALUES (?, ?)
-            ON CONFLICT(player_id, code)
-            DO NOTHING;
-            """,
-            [player_id, code.casefold()]
-        )
-        db.conn.commit()
-        cursor.close()
-
-    @staticmethod
-    def _create_table():
-        log.info("Ensuring table exists: codes")
-        cursor = db.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS codes (
-              code TEXT PRIMARY KEY,
-              expiry INT NULL,
-              posted BOOLEAN default FALSE
-            );
-            """
-        )
-        log.info("Ensuring table exists: code_rewards")
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS code_rewards (
-              code TEXT NOT NULL,
-              reward TEXT NOT NULL,
-              qty INT NOT NULL,
-              PRIMARY KEY (code, reward)
-            );
-            """
-        )
-        log.info("Ensuring table exists: redeemed_codes")
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS redeemed_codes (
-              player_id INT NOT NULL,
-              code TEXT NOT NULL,
-              PRIMARY KEY (player_id, code)
-            );
-            """
-        )
-        cursor.close()
+    @classmethod
+    def _create_table(cls):
+        cls._codes.create()
+        cls._rewards_table.create()
+        cls._redeemed.create()
+        cls._redeemed_index.load()
 
     # endregion
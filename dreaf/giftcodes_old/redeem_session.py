@@ -4,6 +4,7 @@ import asyncio
 import logging
 import pathlib
 import typing as t
+from collections import Counter, defaultdict
 from contextlib import suppress
 
 import aiohttp
@@ -12,8 +13,13 @@ from aiohttp import ContentTypeError
 
 import discord
 
+from dreaf import constants, db
+from dreaf.breaker import CircuitOpen
 from dreaf.giftcodes import GiftCode
+from dreaf.http import clients
 from dreaf.players import Player
+from .engine import Redemption, engine
+from .limiter import breakers, limiters
 
 if t.TYPE_CHECKING:
     from dreaf.bot import DreafBot
@@ -21,9 +27,10 @@ if t.TYPE_CHECKING:
 log = logging.getLogger(__name__)
 
 HEADERS = {"Content-Type": "application/json", "charset": "UTF-8"}
+API_URL = "https://cdkey.lilith.com/api"
+# `info` values meaning a request came too soon after the last
+RATE_LIMITED_INFO = {"err_send_mail_too_often"}
 COOKIE_PATH = pathlib.Path("sessions")
-if not COOKIE_PATH.exists():
-    COOKIE_PATH.mkdir()
 
 SESSIONS: t.Dict[int, RedeemSession] = dict()
 
@@ -32,6 +39,10 @@ class CodeException(Exception):
     pass
 
 
+class TooManyRequests(Exception):
+    pass
+
+
 class CodeUsed(CodeException):
     pass
 
@@ -62,16 +73,49 @@ class ExistingRequest(VerifyFailed):
 
 class RedeemSession:
     _active = set()
+    # tries for a request the API turns away as too frequent, waiting on its limiter between
+    MAX_ATTEMPTS = 3
+    REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=constants.REDEEM_TIMEOUT)
 
     def __init__(self, game_id: int, *, cookie_jar: aiohttp.CookieJar = None):
         self.game_id = game_id
-        if cookie_jar:
-            self.http_session = aiohttp.ClientSession(cookie_jar=cookie_jar, headers=HEADERS)
-        else:
-            self.http_session = aiohttp.ClientSession(headers=HEADERS)
+        self._cookie_jar = cookie_jar
+        self._http_session: t.Optional[aiohttp.ClientSession] = None
 
         SESSIONS[game_id] = self
 
+    @property
+    def http_session(self) -> aiohttp.ClientSession:
+        # each account keeps its own cookies, but connections are pooled with every other session
+        if self._http_session is None:
+            self._http_session = clients.create_session(cookie_jar=self._cookie_jar, headers=HEADERS)
+        return self._http_session
+
+    async def _post(self, endpoint: str, payload: t.Dict[str, t.Any]) -> t.Dict[str, t.Any]:
+        """
+        Post to a cdkey API endpoint as fast as its limiter allows, returning the JSON response.
+
+        A request turned away as too frequent slows the endpoint down and is tried again
+        after waiting its turn, raising `TooManyRequests` if that keeps happening. Each
+        attempt times out on its own after `REQUEST_TIMEOUT`, not counting the wait for the
+        limiter.
+        """
+        limiter = limiters[endpoint]
+        for _ in range(self.MAX_ATTEMPTS):
+            await limiter.acquire()
+            request = self.http_session.post(f"{API_URL}/{endpoint}", json=payload, timeout=self.REQUEST_TIMEOUT)
+            async with breakers[endpoint], request as resp:
+                if resp.status >= 500:
+                    limiter.rejected()
+                    resp.raise_for_status()
+                data = await resp.json() if resp.status != 429 else None
+            if data is None or data.get("info") in RATE_LIMITED_INFO:
+                limiter.rejected()
+                continue
+            limiter.succeeded()
+            return data
+        raise TooManyRequests(f"Lilith endpoint '{endpoint}' is still refusing requests as too frequent.")
+
     async def send_mail(self):
         payload = {
             "game": "afk",
@@ -79,13 +123,12 @@ class RedeemSession:
             "title": "Verification Code",
             "uid": self.game_id
         }
-        async with self.http_session.post("https://cdkey.lilith.com/api/send-mail", json=payload) as resp:
-            try:
-                data = await resp.json()
-                if data.get("info") == "err_send_mail_too_often":
-                    raise VerifyRateLimited
-            except ContentTypeError:
-                raise VerifyFailed("Verification mail was unable to be sent, server error encountered.")
+        try:
+            await self._post("send-mail", payload)
+        except (TooManyRequests, CircuitOpen):
+            raise VerifyRateLimited
+        except (ContentTypeError, aiohttp.ClientResponseError):
+            raise VerifyFailed("Verification mail was unable to be sent, server error encountered.")
 
     async def request_verification_code(
         self,
@@ -135,6 +178,10 @@ class RedeemSession:
 
         try:
             await self.verify_code(message.content)
+        except VerifyRateLimited:
+            # the code may well be right, so don't count it as a wrong attempt
+            self._active.discard(member.id)
+            raise
         except VerifyFailed:
             if is_retry == max_retries:
                 self._active.remove(member.id)
@@ -151,12 +198,14 @@ class RedeemSession:
             "uid": self.game_id,
             "code": verification_code
         }
-        async with self.http_session.post("https://cdkey.lilith.com/api/verify-afk-code", json=payload) as resp:
-            data = await resp.json()
-            if data["info"] == "err_wrong_code":
-                raise VerifyFailed
-            self.save()
-            return data
+        try:
+            data = await self._post("verify-afk-code", payload)
+        except (TooManyRequests, CircuitOpen):
+            raise VerifyRateLimited
+        if data["info"] == "err_wrong_code":
+            raise VerifyFailed
+        self.save()
+        return data
 
     async def verify_code(self, verification_code: str):
         payload = {
@@ -164,12 +213,14 @@ class RedeemSession:
             "uid": self.game_id,
             "code": verification_code
         }
-        async with self.http_session.post("https://cdkey.lilith.com/api/verify-code", json=payload) as resp:
-            data = await resp.json()
-            if data["info"] == "err_wrong_code":
-                raise VerifyFailed
-            self.save()
-            return data
+        try:
+            data = await self._post("verify-code", payload)
+        except (TooManyRequests, CircuitOpen):
+            raise VerifyRateLimited
+        if data["info"] == "err_wrong_code":
+            raise VerifyFailed
+        self.save()
+        return data
 
     async def _redeem_code(self, code: GiftCode, specific_id=None, force=False):
         if not force and code.is_redeemed(self.game_id):
@@ -181,32 +232,31 @@ class RedeemSession:
             "uid": specific_id or self.game_id,
             "cdkey": code.code
         }
-        async with self.http_session.post("https://cdkey.lilith.com/api/cd-key/consume", json=payload) as resp:
-            data = await resp.json()
-            if data["info"] == "err_cdkey_batch_error":
-                raise CodeUsed
-            elif data["info"] == "err_cdkey_expired":
-                raise CodeExpired
-            elif data["info"] == "err_cdkey_record_not_found":
-                raise InvalidCode
-            elif data["info"] == "err_login_state_out_of_date":
-                raise SessionExpired
+        data = await self._post("cd-key/consume", payload)
+        if data["info"] == "err_cdkey_batch_error":
+            raise CodeUsed
+        elif data["info"] == "err_cdkey_expired":
+            raise CodeExpired
+        elif data["info"] == "err_cdkey_record_not_found":
+            raise InvalidCode
+        elif data["info"] == "err_login_state_out_of_date":
+            raise SessionExpired
 
     async def get_users(self):
         payload = {
             "game": "afk",
             "uid": self.game_id,
         }
-        async with self.http_session.post("https://cdkey.lilith.com/api/users", json=payload) as resp:
-            data = await resp.json()
-            if data["info"] == "err_login_state_out_of_date":
-                raise SessionExpired
+        data = await self._post("users", payload)
+        if data["info"] == "err_login_state_out_of_date":
+            raise SessionExpired
         current = Player.get(self.game_id)
         players = []
-        for user in data["data"]["users"]:
-            player = Player(user["uid"], current.discord_id, user["is_main"], user["name"], user["svr_id"], user["level"])
-            player.save()
-            players.append(player)
+        with db.unit_of_work():
+            for user in data["data"]["users"]:
+                player = Player(user["uid"], current.discord_id, user["is_main"], user["name"], user["svr_id"], user["level"])
+                player.save()
+                players.append(player)
         return players
 
     async def is_verified(self):
@@ -217,47 +267,64 @@ class RedeemSession:
         except SessionExpired:
             return False
 
-    async def redeem_codes(self, *codes: GiftCode, ignore_expiry: bool = False) -> t.Dict[Player, t.List[GiftCode]]:
+    async def redeem_iter(self, *codes: GiftCode, ignore_expiry: bool = False) -> t.AsyncIterator[Redemption]:
+        """
+        Redeem the codes for every player on this account, yielding each result as it finishes.
+
+        A code is recorded as soon as every player's job for it has finished, so the codes
+        that finished are kept even if the rest are abandoned. Recording it any earlier would
+        make the remaining players' jobs for it see it as already redeemed.
+        """
         if not await self.is_verified():
             raise SessionExpired
 
         players = await self.get_users()
-
-        players_tasks = dict()
-        all_tasks = []
-        for player in players:
-            players_tasks[player] = dict()
-            for code in codes:
-                task = asyncio.create_task(self._redeem_code(code, specific_id=player.game_id, force=ignore_expiry))
-                players_tasks[player][code] = task
-                all_tasks.append(task)
-
-        await asyncio.gather(*all_tasks, return_exceptions=True)
-        results = dict(success=[], used=[], expired=[], invalid=[])
-        successful = dict()
-        for player, player_tasks in players_tasks.items():
-            successful[player] = []
-            for code, task in player_tasks.items():
-                exc = task.exception()
-                if not exc:
-                    results["success"].append(code)
-                    code.mark_redeemed(self.game_id)
-                    successful[player].append(code)
-                elif isinstance(exc, CodeUsed):
-                    results["used"].append(code)
-                    code: GiftCode
+        if not ignore_expiry:
+            # codes already redeemed are skipped without a request
+            codes = GiftCode.outstanding(self.game_id, codes)
+        jobs = [(player, code) for player in players for code in codes]
+        remaining = Counter(code for _player, code in jobs)
+        outcomes = defaultdict(set)
+        async for result in engine.redeem(self, jobs, force=ignore_expiry):
+            code, exc = result.code, result.error
+            # redeeming it and finding it already used both leave the code redeemed
+            outcomes[code].add(CodeUsed if exc is None else type(exc))
+            remaining[code] -= 1
+            if not remaining[code]:
+                found = outcomes.pop(code)
+                if CodeUsed in found:
                     code.mark_redeemed(self.game_id)
-                elif isinstance(exc, CodeExpired):
-                    results["expired"].append(code)
+                if CodeExpired in found:
                     code.mark_expired()
-                elif isinstance(exc, InvalidCode):
-                    results["invalid"].append(code)
+                elif InvalidCode in found:
                     code.delete()
-                else:
-                    raise exc
+            yield result
 
-        print(f"REDEEM RESULTS: {results}")
-        print(f"REDEEMED: {successful}")
+    async def redeem_codes(self, *codes: GiftCode, ignore_expiry: bool = False) -> t.Dict[Player, t.List[GiftCode]]:
+        results = dict(success=[], used=[], expired=[], invalid=[], deferred=[])
+        successful = dict()
+        errors = []
+        async for result in self.redeem_iter(*codes, ignore_expiry=ignore_expiry):
+            player, code, exc = result
+            successful.setdefault(player, [])
+            if not exc:
+                results["success"].append(code)
+                successful[player].append(code)
+            elif isinstance(exc, CodeUsed):
+                results["used"].append(code)
+            elif isinstance(exc, CodeExpired):
+                results["expired"].append(code)
+            elif isinstance(exc, InvalidCode):
+                results["invalid"].append(code)
+            elif isinstance(exc, (asyncio.TimeoutError, TooManyRequests, CircuitOpen)):
+                # left unredeemed, to be tried again next time
+                results["deferred"].append(code)
+            else:
+                errors.append(exc)
+
+        log.info(f"Redeem results for {self.game_id}: {results}")
+        if errors:
+            raise errors[0]
         return successful
 
     def purge_saves(self):
@@ -266,6 +333,7 @@ class RedeemSession:
 
     def save(self):
         self.purge_saves()
+        COOKIE_PATH.mkdir(exist_ok=True)
         timestamp = pendulum.now().int_timestamp
         self.http_session.cookie_jar.save(COOKIE_PATH/f"{self.game_id}_{timestamp}.session")
 
@@ -286,6 +354,10 @@ class RedeemSession:
 
 
 def init_sessions():
+    """Restore the sessions saved by previous runs, removing any that have expired."""
+    if not COOKIE_PATH.exists():
+        return
+
     for file in COOKIE_PATH.iterdir():
         if file.suffix != ".session":
             continue
@@ -302,6 +374,3 @@ def init_sessions():
         cookie_jar = aiohttp.CookieJar()
         cookie_jar.load(file)
         RedeemSession(game_id, cookie_jar=cookie_jar)
-
-
-init_sessions()
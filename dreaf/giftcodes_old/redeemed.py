@@ -0,0 +1,78 @@
+"""
+An in-memory index of which gift codes each player has redeemed.
+
+Every code seen gets a dense bit position, and each player has one integer used as a
+bitset of the codes they've redeemed. Checking a code is a single bit test, and finding
+which of a list of codes a player still needs is one bitwise operation on two integers.
+
+The index is loaded from `redeemed_codes` when the tables are set up at startup, or on
+first use if that hasn't happened yet. Marking a code redeemed writes the row and sets
+the bit together, so the two never disagree.
+"""
+from __future__ import annotations
+
+import logging
+import typing as t
+
+from dreaf import db
+
+if t.TYPE_CHECKING:
+    from .model import GiftCode
+
+log = logging.getLogger(__name__)
+
+
+class RedeemedIndex:
+    """Redeemed codes by player, backed by a repository of (player_id, code) rows."""
+
+    def __init__(self, repo: db.Repository):
+        self.repo = repo
+        self._bits: t.Dict[str, int] = {}
+        self._players: t.Dict[int, int] = {}
+        self._loaded = False
+
+    def __repr__(self):
+        return f"<RedeemedIndex codes={len(self._bits)} players={len(self._players)}>"
+
+    def load(self):
+        """Read every redeemed code into memory, replacing anything already loaded."""
+        self._bits.clear()
+        self._players.clear()
+        rows = self.repo.select_all(columns=("player_id", "code"))
+        for player_id, code in rows:
+            self._players[player_id] = self._players.get(player_id, 0) | self._bit(code)
+        self._loaded = True
+        log.info(f"Loaded {len(rows)} redeemed codes for {len(self._players)} players.")
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def _bit(self, code: str) -> int:
+        position = self._bits.get(code)
+        if position is None:
+            position = self._bits[code] = len(self._bits)
+        return 1 << position
+
+    def mask(self, codes: t.Iterable[str]) -> int:
+        """The bitset of the given codes."""
+        self._ensure_loaded()
+        mask = 0
+        for code in codes:
+            mask |= self._bit(code)
+        return mask
+
+    def is_redeemed(self, player_id: int, code: str) -> bool:
+        self._ensure_loaded()
+        return bool(self._players.get(player_id, 0) & self._bit(code))
+
+    def mark(self, player_id: int, code: str):
+        """Record a code as redeemed by the player, in the table and the index."""
+        self._ensure_loaded()
+        self.repo.upsert(player_id=player_id, code=code)
+        self._players[player_id] = self._players.get(player_id, 0) | self._bit(code)
+
+    def outstanding(self, player_id: int, codes: t.Sequence[GiftCode]) -> t.List[GiftCode]:
+        """The codes the player hasn't redeemed yet, in the order given."""
+        needed = self.mask(c.code for c in codes) & ~self._players.get(player_id, 0)
+        return [c for c in codes if needed & self._bit(c.code)]
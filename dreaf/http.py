@@ -0,0 +1,95 @@
+"""
+Shared HTTP clients for every outbound integration.
+
+All sessions borrow the same pooled connector, so connections to a host are reused across
+integrations and capped per host, however many sessions exist:
+
+    from dreaf.http import clients
+
+    session = clients.session("reddit", headers={"User-Agent": "..."})
+
+Sessions that need their own cookies, like each account's gift code redemption session,
+are made with `clients.create_session(cookie_jar=...)` and still share the connector.
+
+Nothing is created until first used inside the running event loop.
+"""
+from __future__ import annotations
+
+import logging
+import typing as t
+import weakref
+
+import aiohttp
+
+log = logging.getLogger(__name__)
+
+
+class HTTPClients:
+    """Owns the pooled connector and the named sessions that borrow it."""
+
+    def __init__(
+        self,
+        *,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        keepalive_timeout: float = 30,
+        ttl_dns_cache: int = 300,
+        timeout: aiohttp.ClientTimeout = aiohttp.ClientTimeout(total=30, connect=10, sock_read=20),
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.timeout = timeout
+        self._connector: t.Optional[aiohttp.TCPConnector] = None
+        self._sessions: t.Dict[str, aiohttp.ClientSession] = dict()
+        self._unnamed: weakref.WeakSet = weakref.WeakSet()
+
+    def __repr__(self):
+        return f"<HTTPClients sessions={len(self._sessions) + len(self._unnamed)} limit_per_host={self.limit_per_host}>"
+
+    @property
+    def connector(self) -> aiohttp.TCPConnector:
+        if self._connector is None or self._connector.closed:
+            self._connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.ttl_dns_cache,
+                use_dns_cache=True,
+            )
+        return self._connector
+
+    def _new_session(self, **kwargs) -> aiohttp.ClientSession:
+        kwargs.setdefault("timeout", self.timeout)
+        return aiohttp.ClientSession(connector=self.connector, connector_owner=False, **kwargs)
+
+    def session(self, name: str, **kwargs) -> aiohttp.ClientSession:
+        """
+        Get the shared session for an integration, creating it on first use.
+
+        Any keyword arguments are passed to `aiohttp.ClientSession` when it's created.
+        """
+        session = self._sessions.get(name)
+        if session is None or session.closed:
+            session = self._sessions[name] = self._new_session(**kwargs)
+            log.debug(f"Created HTTP session '{name}'.")
+        return session
+
+    def create_session(self, **kwargs) -> aiohttp.ClientSession:
+        """Create a session of its own, such as for a separate cookie jar, on the shared connector."""
+        session = self._new_session(**kwargs)
+        self._unnamed.add(session)
+        return session
+
+    async def close(self):
+        for session in [*self._sessions.values(), *self._unnamed]:
+            await session.close()
+        self._sessions.clear()
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+        log.info("HTTP clients closed.")
+
+
+clients = HTTPClients()
@@ -217,7 +217,7 @@ class PlayerCommands(commands.Cog, name="Player Info"):
         if not sessions:
             await ctx.send("No Player IDs are verified currently.")
 
-        players = [Player.get(s.game_id) for s in sessions]
+        players = Player.get_many(s.game_id for s in sessions)
         verified = []
         for player in players:
             member = self.bot.guild.get_member(player.discord_id)
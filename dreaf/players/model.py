@@ -12,6 +12,19 @@ log = logging.getLogger(__name__)
 
 
 class Player(db.Table):
+    _repo = db.Repository(
+        "players",
+        {
+            "game_id": "INT PRIMARY KEY",
+            "discord_id": "INT NULL",
+            "main": "BOOLEAN default TRUE",
+            "name": "TEXT NULL",
+            "server_id": "INT default NULL",
+            "level": "INT default NULL",
+        },
+        key="game_id",
+    )
+
     def __init__(self, game_id: int, discord_id: int, main: bool = None, name: str = None, server_id: int = None, level: int = None):
         self.game_id = game_id
         self.discord_id = discord_id
@@ -51,6 +64,16 @@ class Player(db.Table):
             return cls(game_id, discord_id, main, name, server_id, level)
         return None
 
+    @classmethod
+    def get_many(cls, game_ids: t.Iterable[int]) -> t.List[Player]:
+        """The players with the given IDs in the order given, leaving out any that aren't saved."""
+        game_ids = list(game_ids)
+        found = {
+            gid: cls(gid, did, main, name, server_id, level)
+            for (gid, did, main, name, server_id, level) in cls._select_many(game_ids)
+        }
+        return [found[gid] for gid in game_ids if gid in found]
+
     @classmethod
     def get_by_discord_id(cls, discord_id) -> t.List[Player]:
         results = cls._select_all(discord_id=discord_id)
@@ -80,105 +103,44 @@ class Player(db.Table):
 
     @staticmethod
     def _select(game_id=None):
-        cursor = db.conn.execute(
-            """
-            SELECT game_id, discord_id, main, name, server_id, level FROM players WHERE game_id = ?
-            """,
-            [game_id]
-        )
-        data = cursor.fetchone()
-        cursor.close()
-        return data
+        return Player._repo.select(game_id)
+
+    @staticmethod
+    def _select_many(game_ids: t.Iterable[int]):
+        return Player._repo.select_in("game_id", game_ids)
 
     @staticmethod
     def _select_main(discord_id: int):
-        cursor = db.conn.execute(
-            """
-            SELECT game_id, discord_id, main, name, server_id, level
-            FROM players
-            WHERE discord_id = ? AND main = TRUE;
-            """,
-            [discord_id]
-        )
-        data = cursor.fetchone()
-        cursor.close()
-        return data
+        return Player._repo.select_one(discord_id=discord_id, main=True)
 
     @staticmethod
     def _select_all(game_id=None, discord_id=None):
-        select = "SELECT game_id, discord_id, main, name, server_id, level FROM players WHERE "
-        where = []
-        query_items = []
+        where = dict()
         if game_id:
-            where.append("game_id = ?")
-            query_items.append(game_id)
+            where["game_id"] = game_id
         if discord_id:
-            where.append("discord_id = ?")
-            query_items.append(discord_id)
+            where["discord_id"] = discord_id
 
         if not where:
             raise ValueError("Empty query when selecting data from player table.")
 
-        where = ", ".join(where)
-        cursor = db.conn.execute(f"{select}{where};", query_items)
-        data = cursor.fetchall()
-        cursor.close()
-        return data
+        return Player._repo.select_all(**where)
 
     @staticmethod
     def _insert(game_id: int, discord_id: int, main=False, server: int = None, level: int = None):
-        print(f"uid={game_id}, disc={discord_id}, main={main}, server={server}, level={level}")
-        cursor = db.conn.execute(
-            """
-            INSERT INTO players(game_id, discord_id, main, server_id, level) VALUES (?, ?, ?, ?, ?)
-            ON CONFLICT(game_id)
-            DO UPDATE SET
-              discord_id=excluded.discord_id,
-              main=excluded.main,
-              server_id=excluded.server_id,
-              level=excluded.level;
-            """,
-            [game_id, discord_id, main, server, level]
-        )
-        db.conn.commit()
-        cursor.close()
+        log.debug(f"Saving player uid={game_id}, disc={discord_id}, main={main}, server={server}, level={level}")
+        Player._repo.upsert(game_id=game_id, discord_id=discord_id, main=main, server_id=server, level=level)
 
     @staticmethod
     def _insert_name(game_id: int, name: str):
-        cursor = db.conn.execute(
-            """
-            INSERT INTO players(game_id, name) VALUES (?, ?)
-            ON CONFLICT(game_id)
-            DO UPDATE SET
-              name=excluded.name;
-            """,
-            [game_id, name]
-        )
-        db.conn.commit()
-        cursor.close()
+        Player._repo.upsert(game_id=game_id, name=name)
 
     @staticmethod
     def _delete(game_id):
-        cursor = db.conn.execute("DELETE FROM players WHERE game_id = ?", [game_id])
-        db.conn.commit()
-        cursor.close()
+        Player._repo.delete(game_id)
 
-    @staticmethod
-    def _create_table():
-        log.info("Ensuring table exists: players")
-        cursor = db.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS players (
-              game_id INT PRIMARY KEY,
-              discord_id INT NULL,
-              main BOOLEAN default TRUE,
-              name TEXT NULL,
-              server_id INT default NULL,
-              level INT default NULL
-            );
-            """
-        )
-        db.conn.commit()
-        cursor.close()
+    @classmethod
+    def _create_table(cls):
+        cls._repo.create()
 
     # endregion
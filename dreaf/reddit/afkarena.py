@@ -5,8 +5,10 @@ import typing as t
 
 import discord
 
-from .request import Post, Sort, SortTime, get_posts
-from dreaf import db
+from .feeds import Feed
+from .posted import PostedIndex
+from .request import Post, Sort, SortTime, get_posts, get_session
+from dreaf import constants, db
 
 
 log = logging.getLogger(__name__)
@@ -25,12 +27,34 @@ POST_TYPES = {
 
 
 class AFKArenaPost(Post, db.Table):
+    _repo = db.Repository(
+        "afkarena_posted",
+        {
+            "fullname": "TEXT PRIMARY KEY",
+            "created": "INTEGER NOT NULL",
+            "posted": "BOOLEAN default FALSE",
+        },
+        key="fullname",
+        indexes=("created",),
+    )
+    _posted = PostedIndex(_repo, retention=constants.REDDIT_RETENTION_DAYS * 24 * 60 * 60)
+
+    __slots__ = ("posted",)
+
+    subreddit_icon = "https://styles.redditmedia.com/t5_l00gg/styles/communityIcon_crs2klfox3n51.jpg"
+
     def __init__(self, **data):
         super().__init__(**data)
-        self.type = data['data']['link_flair_text']
-        self.colour = POST_TYPES.get(self.type, POST_TYPES[""])["colour"]
-        self.subreddit_icon = "https://styles.redditmedia.com/t5_l00gg/styles/communityIcon_crs2klfox3n51.jpg"
-        self.posted = self.is_posted()
+        # set for a whole listing at once by `load_posted`
+        self.posted = False
+
+    @property
+    def type(self) -> t.Optional[str]:
+        return self.flair
+
+    @property
+    def colour(self) -> discord.Colour:
+        return POST_TYPES.get(self.type, POST_TYPES[""])["colour"]
 
     def embed(self):
         embed = super().embed()
@@ -48,77 +72,56 @@ class AFKArenaPost(Post, db.Table):
             self.set_posted()
 
     def save(self):
-        self._insert(self.permalink, self.created.timestamp())
+        self._insert(self.fullname, self.created.int_timestamp)
 
     def is_posted(self) -> bool:
-        result = self._select(self.permalink)
+        result = self._select(self.fullname)
         if not result:
             return False
-        _permalink, _created, posted = result
+        _fullname, _created, posted = result
         return bool(posted)
 
     def set_posted(self):
-        self._insert(self.permalink, self.created.timestamp(), True)
+        self._posted.record([self])
+
+    @classmethod
+    def load_posted(cls, posts: t.Sequence[AFKArenaPost]):
+        cls._posted.load(posts)
+
+    @classmethod
+    def set_posted_many(cls, posts: t.Sequence[AFKArenaPost]):
+        cls._posted.record(posts)
 
     @classmethod
     async def fetch(cls, *, sort: Sort = Sort.new, time: SortTime = None, limit: int = 25, filter_types=True) -> t.List[AFKArenaPost]:
-        posts: t.List[AFKArenaPost] = await get_posts(SESSION, "afkarena", sort=sort, time=time, limit=limit, cls=cls)
-        posts: t.List[AFKArenaPost] = await get_posts(SESSION, "afkarena", sort=sort, time=time, limit=limit, cls=cls)
+        posts: t.List[AFKArenaPost] = await get_posts(get_session(), "afkarena", sort=sort, time=time, limit=limit, cls=cls)
         if filter_types:
             return [p for p in posts if p.type in ("Guide", "Info")]
         return posts
 
+    @classmethod
+    async def fetch_new(cls) -> t.List[AFKArenaPost]:
+        """Fetch only the posts made since the last time this was called, oldest first."""
+        posts = await FEED.poll()
+        await FEED.advance(posts)
+        return posts
+
     @staticmethod
-    def _select(permalink: str):
-        cursor = db.conn.execute(
-            """
-            SELECT permalink, created, posted
-            FROM afkarena_posts
-            WHERE permalink = ?
-            """,
-            [permalink]
-        )
-        data = cursor.fetchone()
-        cursor.close()
-        return data
+    def _select(fullname: str):
+        return AFKArenaPost._repo.select(fullname)
 
     @staticmethod
-    def _insert(permalink: str, created: int, posted: bool = None):
+    def _insert(fullname: str, created: int, posted: bool = None):
         if posted is not None:
-            cursor = db.conn.execute(
-                """
-                INSERT INTO afkarena_posts(permalink, created, posted) VALUES (?, ?, ?)
-                ON CONFLICT(permalink)
-                DO UPDATE SET
-                  created=excluded.created,
-                  posted=excluded.posted;
-                """,
-                [permalink, created, posted]
-            )
+            AFKArenaPost._repo.upsert(fullname=fullname, created=created, posted=posted)
         else:
-            cursor = db.conn.execute(
-                """
-                INSERT INTO afkarena_posts(permalink, created) VALUES (?, ?)
-                ON CONFLICT(permalink)
-                DO UPDATE SET
-                  created=excluded.created;
-                """,
-                [permalink, created]
-            )
-        db.conn.commit()
-        cursor.close()
+            AFKArenaPost._repo.upsert(fullname=fullname, created=created)
 
-    @staticmethod
-    def _create_table():
-        log.info("Ensuring table exists: afkarena_posts")
-        cursor = db.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS afkarena_posts (
-              permalink TEXT PRIMARY KEY,
-              created INTEGER NOT NULL,
-              posted BOOLEAN default FALSE
-            );
-            """
-        )
-        db.conn.commit()
-        cursor.close()
+    @classmethod
+    def _create_table(cls):
+        cls._repo.create()
+        if db.backend.table_exists("afkarena_posts"):
+            cls._posted.import_permalinks("afkarena_posts")
+
+
+FEED = Feed("afkarena", cls=AFKArenaPost)
@@ -0,0 +1,144 @@
+"""
+Reddit OAuth2 application-only tokens, refreshed in the background before they expire.
+
+However many requests need a token at once, only one refresh is ever in flight: everything
+waiting on a token awaits that same request.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import typing as t
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import aiohttp
+
+from .breaker import CircuitOpen, breakers
+
+log = logging.getLogger(__name__)
+
+AccessToken = namedtuple("AccessToken", ["token", "expires_at"])
+
+
+class AuthenticationError(Exception):
+    pass
+
+
+def backoff_delay(attempt: int, *, base: float = 1, cap: float = 60) -> float:
+    """A random delay before retry `attempt`, from zero up to an exponentially growing limit."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenManager:
+    """Fetches, caches and proactively refreshes a single access token."""
+
+    URL = "https://www.reddit.com"
+    # refresh this long before the token expires, so requests never wait on a refresh
+    REFRESH_MARGIN = timedelta(minutes=5)
+    MAX_RETRIES = 5
+
+    def __init__(
+        self,
+        auth: aiohttp.BasicAuth,
+        headers: t.Mapping[str, str],
+        session: t.Callable[[], aiohttp.ClientSession],
+    ):
+        self.auth = auth
+        self.headers = headers
+        self._session = session
+        self.token: t.Optional[AccessToken] = None
+        self._refreshing: t.Optional[asyncio.Task] = None
+        self._scheduled: t.Optional[asyncio.Task] = None
+
+    def __repr__(self):
+        expires = self.token.expires_at if self.token else None
+        return f"<TokenManager expires_at={expires}>"
+
+    @property
+    def valid(self) -> bool:
+        return self.token is not None and self.token.expires_at > datetime.utcnow()
+
+    async def get(self) -> str:
+        """The current token, waiting for a refresh only if there isn't a valid one."""
+        if not self.valid:
+            await self.refresh()
+        return self.token.token
+
+    async def refresh(self):
+        """Fetch a new token, joining the refresh already in progress if there is one."""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.get_running_loop().create_task(self._fetch())
+        # shielded so a cancelled caller doesn't cancel the refresh for everyone else
+        await asyncio.shield(self._refreshing)
+
+    def invalidate(self):
+        """Drop the current token, such as after it was rejected, so the next request refreshes."""
+        self.token = None
+
+    async def _fetch(self):
+        for attempt in range(self.MAX_RETRIES):
+            try:
+                async with breakers["token"], self._session().post(
+                    url=f"{self.URL}/api/v1/access_token",
+                    headers=self.headers,
+                    auth=self.auth,
+                    data={"grant_type": "client_credentials", "duration": "temporary"},
+                ) as response:
+                    if response.status >= 500:
+                        response.raise_for_status()
+                    if response.status == 200 and response.content_type == "application/json":
+                        content = await response.json()
+                        break
+                    reason = f"status {response.status} & content type {response.content_type}"
+            except CircuitOpen as e:
+                raise AuthenticationError(str(e)) from e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                reason = repr(e)
+
+            log.debug(f"Failed to get an access token: {reason} ({attempt + 1}/{self.MAX_RETRIES})")
+            if attempt + 1 < self.MAX_RETRIES:
+                await asyncio.sleep(backoff_delay(attempt))
+        else:
+            raise AuthenticationError("Authentication with the Reddit API failed.")
+
+        expires_in = timedelta(seconds=int(content["expires_in"]) - 60)  # Subtract 1 minute for leeway.
+        self.token = AccessToken(token=content["access_token"], expires_at=datetime.utcnow() + expires_in)
+        log.debug(f"New token acquired; expires on {self.token.expires_at}")
+        self._schedule_refresh(expires_in - self.REFRESH_MARGIN)
+
+    def _schedule_refresh(self, delay: timedelta):
+        if self._scheduled and not self._scheduled.done():
+            self._scheduled.cancel()
+        self._scheduled = asyncio.get_running_loop().create_task(self._refresh_after(delay.total_seconds()))
+
+    async def _refresh_after(self, delay: float):
+        await asyncio.sleep(max(delay, 0))
+        self._scheduled = None
+        try:
+            await self.refresh()
+        except AuthenticationError:
+            # the current token is still usable for a while, and requests will retry the refresh
+            log.warning("Proactive Reddit token refresh failed.")
+
+    async def revoke(self):
+        """
+        Revoke the token and stop refreshing it.
+        For security reasons, it's good practice to revoke the token when it's no longer being used.
+        """
+        for task in (self._scheduled, self._refreshing):
+            if task and not task.done():
+                task.cancel()
+        if self.token is None:
+            return
+
+        token, self.token = self.token, None
+        async with self._session().post(
+            url=f"{self.URL}/api/v1/revoke_token",
+            headers=self.headers,
+            auth=self.auth,
+            data={"token": token.token, "token_type_hint": "access_token"},
+        ) as response:
+            if response.status not in (200, 204):
+                log.warning(f"Unable to revoke access token: status {response.status}.")
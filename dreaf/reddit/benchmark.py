@@ -0,0 +1,202 @@
+"""
+Benchmark the reddit feed pipeline against the local stand-in server.
+
+    python -m dreaf.reddit.benchmark --backlog 5000 --rate 20 --duration 30
+
+Two phases are run. Throughput catches a feed group up on a backlog of posts, timing
+poll, post building, posted lookups, embed building and batched delivery together, and
+reports posts processed a second. Latency then polls while posts are being made, and
+reports how long after each post was created it reached a channel.
+
+Delivery goes to an in-memory channel, and a throwaway SQLite database is used so the
+real one is never touched.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+import types
+import typing as t
+from pathlib import Path
+
+from dreaf import db
+from dreaf.http import clients
+from . import afkarena, lab_path, request
+from .auth import TokenManager
+from .client import RedditAPI
+from .delivery import Delivery
+from .fakereddit import FakeReddit
+from .feeds import FeedGroup, cursors
+
+if t.TYPE_CHECKING:
+    from .request import Post
+
+
+class SinkWebhook:
+    """Records when each post's embed was delivered instead of sending it."""
+
+    token = "benchmark"
+    name = Delivery.WEBHOOK_NAME
+
+    def __init__(self):
+        self.messages = 0
+        self.delivered: t.List[float] = []
+
+    async def send(self, *, embeds, **_kwargs):
+        self.messages += 1
+        self.delivered.extend(time.time() for _ in embeds)
+
+
+class SinkChannel:
+    id = 0
+
+    def __init__(self, hook: SinkWebhook):
+        self.hook = hook
+
+    def __str__(self):
+        return "benchmark"
+
+    async def webhooks(self):
+        return [self.hook]
+
+
+class Pipeline:
+    """The feed path from poll to delivery, without the cog's per-feed filters so every post is sent."""
+
+    def __init__(self, group: FeedGroup):
+        self.group = group
+        self.hook = SinkWebhook()
+        self.channel = SinkChannel(self.hook)
+        bot = types.SimpleNamespace(user=types.SimpleNamespace(name="Dreaf", avatar_url=""))
+        self.delivery = Delivery(bot)
+        self.polls = 0
+        self.errors = 0
+        self.latencies: t.List[float] = []
+
+    async def poll(self) -> int:
+        self.polls += 1
+        try:
+            posts = await self.group.poll()
+        except Exception:
+            self.errors += 1
+            return 0
+
+        undelivered = []
+        for feed, feed_posts in self.group.split(posts).items():
+            pending = [p for p in feed_posts if not p.posted]
+            sent = await self.delivery.deliver(self.channel, pending)
+            feed.cls.set_posted_many(sent)
+            self._record(sent)
+            undelivered.extend(pending[len(sent):])
+        await self.group.advance(posts, undelivered)
+        return len(posts)
+
+    def _record(self, posts: t.Sequence[Post]):
+        # delivery times are appended in the same order the posts were sent
+        delivered = self.hook.delivered[-len(posts):] if posts else []
+        self.latencies.extend(d - p.created_utc for p, d in zip(posts, delivered))
+
+
+async def throughput(reddit: FakeReddit, group: FeedGroup, backlog: int) -> t.Dict[str, float]:
+    """Catch up on `backlog` posts made since the last poll."""
+    oldest = reddit.generate("afkarena", created=time.time() - 3600)
+    await cursors.set(group.key, {"fullname": oldest['data']['name'], "created": oldest['data']['created_utc']})
+    for i in range(backlog):
+        reddit.generate("afkarena" if i % 3 else "Lab_path")
+
+    pipeline = Pipeline(group)
+    start = time.perf_counter()
+    processed = 0
+    while processed < backlog and pipeline.polls < backlog:
+        processed += await pipeline.poll()
+    elapsed = time.perf_counter() - start
+    return {
+        "posts": processed,
+        "seconds": elapsed,
+        "posts/s": processed / elapsed,
+        "polls": pipeline.polls,
+        "messages": pipeline.hook.messages,
+        "errors": pipeline.errors,
+    }
+
+
+async def latency(reddit: FakeReddit, group: FeedGroup, rate: float, duration: float, interval: float):
+    """Poll every `interval` seconds while posts are made at `rate` a second."""
+    pipeline = Pipeline(group)
+    poster = asyncio.get_running_loop().create_task(reddit.post_forever(rate))
+    end = time.monotonic() + duration
+    try:
+        while time.monotonic() < end:
+            await pipeline.poll()
+            await asyncio.sleep(interval)
+    finally:
+        poster.cancel()
+    # pick up anything made during the last interval
+    await pipeline.poll()
+
+    samples = sorted(pipeline.latencies) or [0.0]
+    return {
+        "posts": len(pipeline.latencies),
+        "p50 ms": statistics.median(samples) * 1000,
+        "p95 ms": samples[int(len(samples) * 0.95) - 1 if len(samples) > 1 else 0] * 1000,
+        "max ms": samples[-1] * 1000,
+        "polls": pipeline.polls,
+        "errors": pipeline.errors,
+    }
+
+
+async def oauth() -> t.Dict[str, float]:
+    """Fetch a listing through the OAuth API client, including getting and revoking a token."""
+    api = RedditAPI(None)
+    start = time.perf_counter()
+    posts = await api.fetch_posts("r/afkarena/new", amount=25)
+    elapsed = time.perf_counter() - start
+    await api.close()
+    return {"posts": len(posts), "ms": elapsed * 1000}
+
+
+async def run(args: argparse.Namespace):
+    reddit = FakeReddit(error_every=args.error_every, error_burst=args.error_burst, rate_limit=args.rate_limit)
+    runner, url = await reddit.start()
+    # point everything that talks to Reddit at the stand-in
+    request.BASE_URL = TokenManager.URL = RedditAPI.OAUTH_URL = url
+
+    with tempfile.TemporaryDirectory() as directory:
+        db.connect(Path(directory) / "benchmark.sqlite")
+        db.create_tables()
+        group = FeedGroup([lab_path.FEED, afkarena.FEED])
+        try:
+            results = {
+                "throughput": await throughput(reddit, group, args.backlog),
+                "oauth": await oauth(),
+                "latency": await latency(reddit, group, args.rate, args.duration, args.interval),
+            }
+        finally:
+            await clients.close()
+            await runner.cleanup()
+            db.close()
+
+    for phase, numbers in results.items():
+        print(phase)
+        for name, value in numbers.items():
+            print(f"  {name:<10} {value:>12.1f}" if isinstance(value, float) else f"  {name:<10} {value:>12}")
+    print(f"server     {reddit.requests} requests, {reddit.errors} injected errors")
+
+
+def main(argv: t.Sequence[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the reddit feed pipeline against a local stand-in.")
+    parser.add_argument("--backlog", type=int, default=2000, help="Posts to catch up on for throughput.")
+    parser.add_argument("--rate", type=float, default=10, help="New posts a second for latency.")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to measure latency over.")
+    parser.add_argument("--interval", type=float, default=0.5, help="Seconds between polls for latency.")
+    parser.add_argument("--rate-limit", type=int, default=100_000, help="Requests the server allows each window.")
+    parser.add_argument("--error-every", type=int, default=0, help="Start a burst of 503s every N requests.")
+    parser.add_argument("--error-burst", type=int, default=3, help="How many 503s in each burst.")
+    asyncio.run(run(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
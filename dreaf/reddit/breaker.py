@@ -0,0 +1,6 @@
+"""Circuit breakers for the Reddit endpoints: listing, by_id, oauth and token."""
+from dreaf.breaker import Breakers, CircuitOpen
+
+__all__ = ("CircuitOpen", "breakers")
+
+breakers = Breakers("reddit")
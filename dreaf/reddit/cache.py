@@ -0,0 +1,146 @@
+"""
+A short-lived cache of Reddit JSON responses, for lookups that users repeat.
+
+Responses are kept for a few seconds, keyed by URL, query parameters and who the request
+is authorized as, so an OAuth response is never served to an anonymous request or to
+another token. Once stale, the next request sends the `ETag` and `Last-Modified` it was
+given back as conditional headers, and a `304 Not Modified` reuses the cached body.
+Concurrent requests for the same key share a single request to Reddit.
+
+Cached bodies are shared between callers, so they must not be modified.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import typing as t
+from collections import OrderedDict
+
+import aiohttp
+
+from .ratelimit import rate_limit
+
+log = logging.getLogger(__name__)
+
+Key = t.Tuple[str, t.Tuple[t.Tuple[str, str], ...], t.Optional[str]]
+
+
+class CachedResponse(t.NamedTuple):
+    status: int
+    content_type: str
+    data: t.Any
+    etag: t.Optional[str] = None
+    last_modified: t.Optional[str] = None
+
+
+class ResponseCache:
+    """Caches successful GET responses for `ttl` seconds, keeping up to `size` of them."""
+
+    def __init__(self, *, ttl: float = 30, size: int = 256, loads: t.Callable[[bytes], t.Any] = json.loads):
+        self.ttl = ttl
+        self.size = size
+        self.loads = loads
+        self.hits = 0
+        self.misses = 0
+        self._entries: t.OrderedDict[Key, t.Tuple[float, CachedResponse]] = OrderedDict()
+        self._in_flight: t.Dict[Key, asyncio.Task] = {}
+
+    def __repr__(self):
+        return f"<ResponseCache entries={len(self._entries)} hits={self.hits} misses={self.misses}>"
+
+    @staticmethod
+    def key(url: str, params: t.Mapping[str, t.Any] = None, headers: t.Mapping[str, str] = None) -> Key:
+        auth = (headers or {}).get("Authorization")
+        # a digest, so tokens aren't kept around in the cache's keys
+        identity = hashlib.sha256(auth.encode()).hexdigest() if auth else None
+        return url, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items())), identity
+
+    def clear(self):
+        self._entries.clear()
+
+    async def get(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        *,
+        params: t.Mapping[str, t.Any] = None,
+        headers: t.Mapping[str, str] = None,
+    ) -> CachedResponse:
+        """
+        GET the url, from the cache if it was fetched within the last `ttl` seconds.
+
+        The `Authorization` header is part of the key, but no other header is, so anything
+        else sent must give the same response whichever value is used.
+        """
+        key = self.key(url, params, headers)
+        cached = self._entries.get(key)
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return cached[1]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            stale = cached[1] if cached else None
+            task = asyncio.get_running_loop().create_task(self._fetch(session, key, url, params, headers, stale))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.hits += 1
+        # shielded so a cancelled caller doesn't cancel the request for everyone else
+        return await asyncio.shield(task)
+
+    def _store(self, key: Key, response: CachedResponse):
+        self._entries[key] = (time.monotonic(), response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    async def _fetch(
+        self,
+        session: aiohttp.ClientSession,
+        key: Key,
+        url: str,
+        params: t.Optional[t.Mapping[str, t.Any]],
+        headers: t.Optional[t.Mapping[str, str]],
+        stale: t.Optional[CachedResponse],
+    ) -> CachedResponse:
+        response = await self._request(session, url, params, headers, stale)
+        if response.status == 200:
+            self._store(key, response)
+        return response
+
+    async def _request(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        params: t.Optional[t.Mapping[str, t.Any]],
+        headers: t.Optional[t.Mapping[str, str]],
+        stale: t.Optional[CachedResponse],
+    ) -> CachedResponse:
+        headers = dict(headers or {})
+        if stale and stale.etag:
+            headers["If-None-Match"] = stale.etag
+        if stale and stale.last_modified:
+            headers["If-Modified-Since"] = stale.last_modified
+
+        async with session.get(url, params=params or {}, headers=headers) as resp:
+            rate_limit.update(resp.headers)
+            if resp.status >= 500:
+                resp.raise_for_status()
+            if resp.status == 304 and stale:
+                log.debug(f"{url} not modified, reusing the cached response.")
+                return stale
+            is_json = resp.content_type == "application/json"
+            data = self.loads(await resp.read()) if resp.status == 200 and is_json else None
+            return CachedResponse(
+                status=resp.status,
+                content_type=resp.content_type,
+                data=data,
+                etag=resp.headers.get("ETag"),
+                last_modified=resp.headers.get("Last-Modified"),
+            )
@@ -1,16 +1,22 @@
 from __future__ import annotations
 
 import asyncio
+import functools
 import logging
+import time
 import typing as t
 
 import discord
 from discord.ext import commands
 
+from . import afkarena, feeds, lab_path
 from .lab_path import LabPathPost
 from .afkarena import AFKArenaPost
+from .breaker import breakers
 from .client import RedditAPI
+from .delivery import Delivery
 from .request import Post
+from .scheduler import PollScheduler
 from dreaf import constants, checks
 
 if t.TYPE_CHECKING:
@@ -30,76 +36,103 @@ class RedditCommands(commands.Cog, name="Reddit"):
 
     def __init__(self, bot: DreafBot):
         self.bot = bot
-        # self.labpath_task = None
-        # self.afk_feed_task = None
-        # self.setup_labpath_task()
-        # self.setup_afk_feed_task()
         self.reddit_api = RedditAPI(bot)
+        self.delivery = Delivery(bot)
+        self.handlers = {
+            lab_path.FEED: self.post_labpaths,
+            afkarena.FEED: self.post_afk_feed,
+        }
+        # one combined listing request polls every feed
+        self.scheduler = PollScheduler()
+        for group in feeds.group_feeds(self.handlers):
+            self.scheduler.add(group, functools.partial(self.post_feeds, group), min_interval=60 * 2, max_interval=60 * 30)
+        self.feeds_task = None
+        self.setup_feeds_task()
+        self.compact_task = self.bot.loop.create_task(self.compact_posted())
+        self.compact_task.add_done_callback(self.task_error)
 
-    # @property
-    # def labpath_channel(self):
-    #     return self.bot.get_channel(constants.LAB_PATH_CHANNEL)
-    #
-    # def setup_labpath_task(self):
-    #     if self.labpath_task:
-    #         self.labpath_task.cancel()
-    #     self.labpath_task = self.bot.loop.create_task(self.update_labpaths())
-    #     self.labpath_task.add_done_callback(self.task_error)
-    #
-    # async def update_labpaths(self):
-    #     """Update the lab path feed channel every hour."""
-    #     await self.bot.wait_until_ready()
-    #
-    #     if not self.labpath_channel:
-    #         log.warning("Labpath channel doesn't exist. Cancelling Lab Path task.")
-    #         return
-    #
-    #     while True:
-    #         log.info("Labpath task starting.")
-    #         posts: t.List[LabPathPost] = await LabPathPost.fetch()
-    #         for post in posts:
-    #             if post.posted:
-    #                 continue
-    #             log.info(f"New labpath being posted: {post.permalink}")
-    #             await post.send(self.labpath_channel, mark_posted=True)
-    #         log.info("Labpath task sleeping for 1 hr.")
-    #         await asyncio.sleep(60*60)
-    #
-    # @property
-    # def afk_feed_channel(self):
-    #     return self.bot.get_channel(constants.AFK_FEED_CHANNEL)
-    #
-    # @property
-    # def map_guide_channel(self):
-    #     return self.bot.get_channel(constants.MAP_GUIDE_CHANNEL)
-    #
-    # def setup_afk_feed_task(self):
-    #     if self.afk_feed_task:
-    #         self.afk_feed_task.cancel()
-    #     self.afk_feed_task = self.bot.loop.create_task(self.update_afk_feed())
-    #     self.afk_feed_task.add_done_callback(self.task_error)
-    #
-    # async def update_afk_feed(self):
-    #     """Update the lab path feed channel every hour."""
-    #     await self.bot.wait_until_ready()
-    #
-    #     if not self.afk_feed_channel:
-    #         log.warning("AFK feed channel doesn't exist. Cancelling AFK feed task.")
-    #         return
-    #
-    #     while True:
-    #         log.info("AFK feed task starting.")
-    #         posts: t.List[AFKArenaPost] = await AFKArenaPost.fetch()
-    #         for post in posts:
-    #             if post.posted:
-    #                 continue
-    #             log.info(f"New AFK feed post: {post.permalink}")
-    #             await post.send(self.afk_feed_channel, mark_posted=True)
-    #             if post.is_map_guide:
-    #                 log.info(f"New Map Guide: {post.permalink}")
-    #                 await post.send(self.map_guide_channel)
-    #         log.info("AFK feed task sleeping for 15 mins.")
-    #         await asyncio.sleep(60*15)
+    def cog_unload(self):
+        if self.feeds_task:
+            self.feeds_task.cancel()
+        self.compact_task.cancel()
+        self.bot.loop.create_task(self.reddit_api.close())
+
+    async def shutdown(self):
+        await self.reddit_api.close()
+
+    @property
+    def labpath_channel(self):
+        return self.bot.get_channel(constants.LAB_PATH_CHANNEL)
+
+    @property
+    def afk_feed_channel(self):
+        return self.bot.get_channel(constants.AFK_FEED_CHANNEL)
+
+    @property
+    def map_guide_channel(self):
+        return self.bot.get_channel(constants.MAP_GUIDE_CHANNEL)
+
+    def setup_feeds_task(self):
+        if self.feeds_task:
+            self.feeds_task.cancel()
+        self.feeds_task = self.bot.loop.create_task(self.run_feeds())
+        self.feeds_task.add_done_callback(self.task_error)
+
+    async def run_feeds(self):
+        """Poll the reddit feeds and post anything new to their channels."""
+        await self.bot.wait_until_ready()
+        await self.scheduler.run()
+
+    async def compact_posted(self):
+        """Regularly prune the posted records that have passed their retention."""
+        await self.bot.wait_until_ready()
+        while True:
+            for cls in (LabPathPost, AFKArenaPost):
+                await cls._posted.compact()
+            await asyncio.sleep(constants.REDDIT_COMPACT_HOURS * 60 * 60)
+
+    async def post_feeds(self, group: feeds.FeedGroup, posts: t.List[Post]) -> t.List[Post]:
+        """Pass the posts from a feed group's poll to the handler of each feed, returning those undelivered."""
+        undelivered = []
+        for feed, feed_posts in group.split(posts).items():
+            if not feed_posts:
+                continue
+            try:
+                undelivered.extend(await self.handlers[feed](feed_posts))
+            except Exception:
+                log.exception(f"Handling new posts from r/{feed.subreddit} failed.")
+                undelivered.extend(feed_posts)
+        return undelivered
+
+    async def post_labpaths(self, posts: t.List[LabPathPost]) -> t.List[LabPathPost]:
+        pending = [p for p in posts if not p.posted]
+        if not self.labpath_channel:
+            log.warning("Labpath channel doesn't exist, keeping new posts for later.")
+            return pending
+
+        for post in pending:
+            log.info(f"New labpath being posted: {post.permalink}")
+        sent = await self.delivery.deliver(self.labpath_channel, pending)
+        LabPathPost.set_posted_many(sent)
+        return pending[len(sent):]
+
+    async def post_afk_feed(self, posts: t.List[AFKArenaPost]) -> t.List[AFKArenaPost]:
+        pending = [p for p in posts if not p.posted and p.type in ("Guide", "Info")]
+        if not self.afk_feed_channel:
+            log.warning("AFK feed channel doesn't exist, keeping new posts for later.")
+            return pending
+
+        for post in pending:
+            log.info(f"New AFK feed post: {post.permalink}")
+        sent = await self.delivery.deliver(self.afk_feed_channel, pending)
+        AFKArenaPost.set_posted_many(sent)
+
+        guides = [p for p in sent if p.is_map_guide]
+        if guides and self.map_guide_channel:
+            for post in guides:
+                log.info(f"New Map Guide: {post.permalink}")
+            await self.delivery.deliver(self.map_guide_channel, guides)
+        return pending[len(sent):]
 
     # @commands.group(invoke_without_command=True)
     # async def post(self, ctx, url: url_str):
@@ -112,13 +145,12 @@ class RedditCommands(commands.Cog, name="Reddit"):
 
     @commands.group(invoke_without_command=True)
     async def post(self, ctx, subreddit: str):
-        """Get a specific reddit post."""
-        post = await self.reddit_api.fetch_posts(f"{subreddit}/new", params={"t": "all"})
-        print(post)
-        # if not post:
-        #     await ctx.send("Couldn't find a post matching that URL.")
-        #     return
-        # await post.send(ctx.channel)
+        """Get the newest post of a subreddit."""
+        posts = await self.reddit_api.fetch_posts(f"{subreddit}/new", amount=1, params={"t": "all"})
+        if not posts:
+            await ctx.send("Couldn't find any posts there.")
+            return
+        await Post(**posts[0]).send(ctx.channel)
 
     # @post.command(name="afk")
     # async def afk_post(self, ctx, url: url_str):
@@ -129,38 +161,73 @@ class RedditCommands(commands.Cog, name="Reddit"):
     #         return
     #     await post.send(ctx.channel)
     #
-    # @checks.is_exemplar()
-    # @commands.group(invoke_without_command=True)
-    # async def reset(self, ctx):
-    #     """Reset reddit feed background tasks."""
-    #     self.setup_labpath_task()
-    #     self.setup_afk_feed_task()
-    #     await ctx.send("LabPath and AFK feed tasks have been reset.")
-    #
-    # @checks.is_exemplar()
-    # @reset.command(name="lab", aliases=["labpath"])
-    # async def reset_labpath(self, ctx):
-    #     """Reset the LabPath reddit feed task."""
-    #     self.setup_labpath_task()
-    #     await ctx.send("LabPath feed task has been reset.")
-    #
-    # @checks.is_exemplar()
-    # @reset.command(name="afk", aliases=["afkfeed"])
-    # async def reset_labpath(self, ctx):
-    #     """Reset the AfK reddit feed task."""
-    #     self.setup_afk_feed_task()
-    #     await ctx.send("AFK feed task has been reset.")
-    #
+    @checks.is_exemplar()
+    @commands.command()
+    async def reset(self, ctx):
+        """Reset the reddit feed background task."""
+        self.setup_feeds_task()
+        await ctx.send("Reddit feed task has been reset.")
+
+    @checks.is_exemplar()
+    @commands.command()
+    async def backfill(self, ctx, feed: str, hours: int = 24):
+        """
+        Post anything missed from a reddit feed over the last few hours.
+
+        Feed can be `lab` or `afk`.
+        """
+        targets = {
+            "lab": (LabPathPost, lab_path.FEED, self.post_labpaths),
+            "afk": (AFKArenaPost, afkarena.FEED, self.post_afk_feed),
+        }
+        if feed not in targets:
+            await ctx.send(f"Unknown feed, it can be one of: {', '.join(targets)}")
+            return
+
+        cls, target, handler = targets[feed]
+        since = time.time() - hours * 60 * 60
+        async with ctx.typing():
+            missed = [p async for p in feeds.backfill(target.subreddit, cls=cls, since=since) if not p.posted]
+            # oldest first, the same as a live feed
+            undelivered = await handler(missed[::-1])
+        # delivered posts are recorded as posted, while those the feed filters out are left alone
+        delivered = sum(1 for p in missed if p.posted)
+        message = f"Backfilled {delivered} posts from r/{target.subreddit}."
+        if undelivered:
+            message += f" {len(undelivered)} couldn't be delivered, try again later."
+        await ctx.send(message)
+
+    @checks.is_exemplar()
+    @commands.command(name="feeds")
+    async def feeds_status(self, ctx):
+        """Show how often each reddit feed is being polled and the health of each endpoint."""
+        rate = self.scheduler.rate
+        lines = []
+        for scheduled in self.scheduler.feeds:
+            due = max(scheduled.next_poll - time.monotonic(), 0)
+            lines.append(
+                f"r/{scheduled.feed.subreddit}: every {scheduled.interval / 60:.1f} mins, "
+                f"next in {due / 60:.1f} mins, {scheduled.last_count} new last poll"
+            )
+        if rate.remaining is not None:
+            lines.append(f"Rate limit: {rate.remaining:.0f} requests left, resets in {rate.reset_in:.0f}s")
+        for name, status in breakers.status().items():
+            line = f"Endpoint {name}: {status['state']}, {status['failures']} failures"
+            if status['retry_after']:
+                line += f", retry in {status['retry_after']:.0f}s"
+            lines.append(line)
+        await ctx.send("\n".join(lines))
+
     # async def cog_command_error(self, ctx, error):
     #     await ctx.send(f"Error: {error}")
-    #
-    # @staticmethod
-    # def task_error(task: asyncio.Task):
-    #     try:
-    #         exc = task.exception()
-    #     except asyncio.CancelledError:
-    #         log.info(f"Task '{task.get_coro().__name__}' was cancelled.")
-    #         return
-    #
-    #     if exc:
-    #         task.result()
+
+    @staticmethod
+    def task_error(task: asyncio.Task):
+        try:
+            exc = task.exception()
+        except asyncio.CancelledError:
+            log.info(f"Task '{task.get_coro().__name__}' was cancelled.")
+            return
+
+        if exc:
+            task.result()
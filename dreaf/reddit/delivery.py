@@ -0,0 +1,117 @@
+"""
+Batched delivery of feed posts through channel webhooks.
+
+A webhook message can hold up to 10 embeds, and webhooks are rate limited separately
+from the bot's own messages in the channel, so catching up on a backlog takes a few
+requests rather than one per post. discord.py waits out the webhook's bucket itself when
+a response says it's empty.
+
+Posts to the same channel are delivered one batch at a time in the order given, even
+when several feeds deliver to it at once.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import typing as t
+from collections import defaultdict
+
+import discord
+
+from .request import Post
+
+if t.TYPE_CHECKING:
+    from dreaf.bot import DreafBot
+
+log = logging.getLogger(__name__)
+
+P = t.TypeVar("P", bound=Post)
+
+
+class Delivery:
+    """Sends posts to channels through a webhook in each, falling back to plain messages."""
+
+    WEBHOOK_NAME = "Dreaf Feeds"
+    # the most embeds in one message, and the most characters across all of them
+    MAX_EMBEDS = 10
+    MAX_CHARS = 6000
+
+    def __init__(self, bot: DreafBot):
+        self.bot = bot
+        self._webhooks: t.Dict[int, t.Optional[discord.Webhook]] = {}
+        self._locks: t.DefaultDict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    def __repr__(self):
+        return f"<Delivery webhooks={sum(1 for w in self._webhooks.values() if w)}>"
+
+    async def webhook(self, channel: discord.TextChannel) -> t.Optional[discord.Webhook]:
+        """The channel's feed webhook, created if needed, or None without permission to manage them."""
+        if channel.id not in self._webhooks:
+            try:
+                # only webhooks the bot made have a token it can send with
+                hooks = [h for h in await channel.webhooks() if h.name == self.WEBHOOK_NAME and h.token]
+                hook = hooks[0] if hooks else await channel.create_webhook(
+                    name=self.WEBHOOK_NAME, reason="Reddit feed delivery"
+                )
+            except discord.Forbidden:
+                log.warning(f"No permission to manage webhooks in #{channel}, sending posts one at a time.")
+                hook = None
+            self._webhooks[channel.id] = hook
+        return self._webhooks[channel.id]
+
+    @classmethod
+    def batches(cls, posts: t.Sequence[P]) -> t.Iterator[t.List[t.Tuple[P, discord.Embed]]]:
+        """Split posts and their embeds into message sized batches, keeping their order."""
+        batch = []
+        chars = 0
+        for post in posts:
+            embed = post.embed()
+            length = len(embed)
+            if batch and (len(batch) >= cls.MAX_EMBEDS or chars + length > cls.MAX_CHARS):
+                yield batch
+                batch = []
+                chars = 0
+            batch.append((post, embed))
+            chars += length
+        if batch:
+            yield batch
+
+    async def deliver(self, channel: discord.TextChannel, posts: t.Sequence[P]) -> t.List[P]:
+        """
+        Send the posts to the channel in order, returning those that were delivered.
+
+        Delivery stops at the first batch that fails, so the posts returned are always the
+        start of those given. The feed handlers report the rest as undelivered, which keeps
+        the feed's cursor before them so they're fetched and retried in order next poll.
+        """
+        delivered = []
+        async with self._locks[channel.id]:
+            for batch in self.batches(posts):
+                embeds = [embed for _post, embed in batch]
+                try:
+                    await self._send(channel, embeds)
+                except discord.HTTPException:
+                    log.exception(
+                        f"Delivering {len(embeds)} posts to #{channel} failed, "
+                        f"leaving {len(posts) - len(delivered)} undelivered."
+                    )
+                    break
+                delivered.extend(post for post, _embed in batch)
+        return delivered
+
+    async def _send(self, channel: discord.TextChannel, embeds: t.List[discord.Embed], *, retry: bool = True):
+        hook = await self.webhook(channel)
+        if hook is None:
+            for embed in embeds:
+                await channel.send(embed=embed)
+            return
+
+        user = self.bot.user
+        try:
+            await hook.send(embeds=embeds, username=user.name, avatar_url=str(user.avatar_url), wait=True)
+        except discord.NotFound:
+            if not retry:
+                raise
+            # the webhook was deleted, so make a new one and try once more
+            self._webhooks.pop(channel.id, None)
+            await self._send(channel, embeds, retry=False)
@@ -0,0 +1,279 @@
+"""
+A local stand-in for the parts of Reddit's API the feeds use, for benchmarks and trying
+changes without live Reddit.
+
+    python -m dreaf.reddit.fakereddit --port 8080 --rate 2
+
+It serves subreddit listings with `before`/`after`/`limit` pagination, including
+combined `r/a+b` listings, `by_id` lookups and OAuth token issue and revocation. Posts
+are generated as a mix of text, image and gallery posts, and can also be loaded from a
+file of recorded listings. Every response carries `X-Ratelimit-*` headers from a fixed
+window, and bursts of 503 responses can be injected to exercise error handling.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import secrets
+import time
+import typing as t
+from pathlib import Path
+
+from aiohttp import web
+
+log = logging.getLogger(__name__)
+
+FLAIRS = {
+    "afkarena": ["Guide", "Info", "Discussion", "Meme", "Question", None],
+    "lab_path": [":Text: Arcane Labyrinth", ":Text: Dismal Maze", None],
+}
+
+
+class FakeReddit:
+    """The posts and request accounting behind the stand-in server."""
+
+    def __init__(
+        self,
+        subreddits: t.Iterable[str] = ("afkarena", "Lab_path"),
+        *,
+        rate_limit: int = 600,
+        window: float = 600,
+        error_every: int = 0,
+        error_burst: int = 3,
+    ):
+        self.subreddits = {name.casefold(): name for name in subreddits}
+        # newest first, the same as a listing
+        self.posts: t.Dict[str, t.List[t.Dict[str, t.Any]]] = {name: [] for name in self.subreddits}
+        self.by_id: t.Dict[str, t.Dict[str, t.Any]] = {}
+        self.rate_limit = rate_limit
+        self.window = window
+        self.error_every = error_every
+        self.error_burst = error_burst
+        self.requests = 0
+        self.errors = 0
+        self.tokens: t.Set[str] = set()
+        self._ids = itertools.count(random.randrange(36 ** 5))
+        self._window_start = time.monotonic()
+        self._window_used = 0
+
+    def __repr__(self):
+        return f"<FakeReddit posts={len(self.by_id)} requests={self.requests}>"
+
+    # region: posts
+
+    def add(self, data: t.Dict[str, t.Any]) -> t.Dict[str, t.Any]:
+        """Add a post's data, as the newest in its subreddit."""
+        child = {"kind": "t3", "data": data}
+        self.posts[data['subreddit'].casefold()].insert(0, child)
+        self.by_id[data['name']] = child
+        return child
+
+    def generate(self, subreddit: str, *, created: float = None) -> t.Dict[str, t.Any]:
+        """Add a new post of a random kind to a subreddit."""
+        name = self.subreddits[subreddit.casefold()]
+        post_id = _base36(next(self._ids))
+        data = {
+            "name": f"t3_{post_id}",
+            "id": post_id,
+            "created_utc": time.time() if created is None else created,
+            "title": f"Post {post_id} &amp; more",
+            "author": random.choice(["datguywind", "someone", "another_one"]),
+            "subreddit": name,
+            "permalink": f"/r/{name}/comments/{post_id}/post_{post_id}/",
+            "link_flair_text": random.choice(FLAIRS.get(subreddit.casefold(), [None])),
+            "over_18": False,
+            "selftext": "",
+            "url": f"https://reddit.com/r/{name}/comments/{post_id}/",
+            "is_gallery": False,
+        }
+        kind = random.random()
+        if kind < 0.3:
+            data["url"] = f"https://i.redd.it/{post_id}.png"
+        elif kind < 0.5:
+            media = [f"{post_id}m{i}" for i in range(3)]
+            data["is_gallery"] = True
+            data["url"] = f"https://www.reddit.com/gallery/{post_id}"
+            data["gallery_data"] = {"items": [{"media_id": m} for m in media]}
+            data["media_metadata"] = {
+                m: {"status": "valid", "s": {"u": f"https://preview.redd.it/{m}.jpg?a=1&amp;b=2"}} for m in media
+            }
+        else:
+            data["selftext"] = "Some text. " * random.randint(1, 60)
+        return self.add(data)
+
+    def load(self, path: Path):
+        """Add the posts of recorded listings, a JSON list of listing responses, oldest last."""
+        listings = json.loads(path.read_text())
+        for listing in reversed(listings):
+            for child in reversed(listing['data']['children']):
+                if child['data']['subreddit'].casefold() in self.subreddits:
+                    self.add(child['data'])
+
+    def listing(self, subreddits: str, params: t.Mapping[str, str]) -> t.Dict[str, t.Any]:
+        names = [s.casefold() for s in subreddits.split("+")]
+        children = [c for name in names for c in self.posts.get(name, [])]
+        if len(names) > 1:
+            children.sort(key=lambda c: c['data']['created_utc'], reverse=True)
+
+        limit = min(int(params.get("limit", 25)), 100)
+        fullnames = [c['data']['name'] for c in children]
+        if "before" in params:
+            end = fullnames.index(params["before"]) if params["before"] in fullnames else 0
+            page = children[max(end - limit, 0):end]
+        elif "after" in params:
+            start = fullnames.index(params["after"]) + 1 if params["after"] in fullnames else len(children)
+            page = children[start:start + limit]
+        else:
+            page = children[:limit]
+
+        return {
+            "kind": "Listing",
+            "data": {
+                "children": page,
+                "before": page[0]['data']['name'] if page else None,
+                "after": page[-1]['data']['name'] if len(page) == limit else None,
+            },
+        }
+
+    # endregion
+
+    # region: accounting
+
+    def _limit_headers(self) -> t.Dict[str, str]:
+        now = time.monotonic()
+        if now - self._window_start >= self.window:
+            self._window_start = now
+            self._window_used = 0
+        self._window_used += 1
+        reset = self.window - (now - self._window_start)
+        return {
+            "X-Ratelimit-Used": str(self._window_used),
+            "X-Ratelimit-Remaining": str(max(self.rate_limit - self._window_used, 0)),
+            "X-Ratelimit-Reset": str(int(reset)),
+        }
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        self.requests += 1
+        headers = self._limit_headers()
+        if self._window_used > self.rate_limit:
+            return web.json_response({"error": 429}, status=429, headers=headers)
+        if self.error_every and self.requests >= self.error_every and self.requests % self.error_every < self.error_burst:
+            self.errors += 1
+            return web.Response(status=503, text="Service Unavailable", headers=headers)
+        response = await handler(request)
+        response.headers.update(headers)
+        return response
+
+    # endregion
+
+    # region: routes
+
+    async def get_listing(self, request: web.Request) -> web.Response:
+        return web.json_response(self.listing(request.match_info["subreddits"], request.query), dumps=_dumps)
+
+    async def get_by_id(self, request: web.Request) -> web.Response:
+        child = self.by_id.get(request.match_info["fullname"])
+        listing = {"kind": "Listing", "data": {"children": [child] if child else [], "before": None, "after": None}}
+        return web.json_response(listing, dumps=_dumps)
+
+    async def access_token(self, request: web.Request) -> web.Response:
+        if request.headers.get("Authorization") is None:
+            return web.json_response({"error": 401}, status=401)
+        token = secrets.token_urlsafe(16)
+        self.tokens.add(token)
+        return web.json_response({"access_token": token, "token_type": "bearer", "expires_in": 3600})
+
+    async def revoke_token(self, request: web.Request) -> web.Response:
+        data = await request.post()
+        self.tokens.discard(data.get("token"))
+        return web.Response(status=204)
+
+    async def oauth_listing(self, request: web.Request) -> web.Response:
+        auth = request.headers.get("Authorization", "")
+        if auth.removeprefix("bearer ") not in self.tokens:
+            return web.json_response({"error": 401}, status=401)
+        return await self.get_listing(request)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.add_routes([
+            web.get("/r/{subreddits}/new.json", self.get_listing),
+            web.get("/r/{subreddits}/new", self.oauth_listing),
+            web.get("/by_id/{fullname}.json", self.get_by_id),
+            web.post("/api/v1/access_token", self.access_token),
+            web.post("/api/v1/revoke_token", self.revoke_token),
+        ])
+        return app
+
+    # endregion
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> t.Tuple[web.AppRunner, str]:
+        """Serve in the background, returning the runner to clean up and the base URL."""
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        port = runner.addresses[0][1]
+        return runner, f"http://{host}:{port}"
+
+    async def post_forever(self, rate: float):
+        """Add posts to random subreddits at around `rate` a second."""
+        while True:
+            await asyncio.sleep(random.expovariate(rate))
+            self.generate(random.choice(list(self.subreddits)))
+
+
+def _base36(number: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    result = ""
+    while True:
+        number, digit = divmod(number, 36)
+        result = digits[digit] + result
+        if not number:
+            return result
+
+
+def _dumps(value: t.Any) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+
+async def serve(args: argparse.Namespace):
+    reddit = FakeReddit(rate_limit=args.rate_limit, error_every=args.error_every, error_burst=args.error_burst)
+    if args.listings:
+        reddit.load(args.listings)
+    for _ in range(args.seed):
+        reddit.generate(random.choice(list(reddit.subreddits)))
+    runner, url = await reddit.start(port=args.port)
+    print(f"Fake Reddit serving on {url}")
+    try:
+        if args.rate:
+            await reddit.post_forever(args.rate)
+        else:
+            await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def main(argv: t.Sequence[str] = None):
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Reddit API.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--seed", type=int, default=100, help="Posts to generate up front.")
+    parser.add_argument("--rate", type=float, default=0, help="New posts a second once running.")
+    parser.add_argument("--listings", type=Path, help="A JSON file of recorded listings to serve.")
+    parser.add_argument("--rate-limit", type=int, default=600, help="Requests allowed each 10 minutes.")
+    parser.add_argument("--error-every", type=int, default=0, help="Start a burst of 503s every N requests.")
+    parser.add_argument("--error-burst", type=int, default=3, help="How many 503s in each burst.")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
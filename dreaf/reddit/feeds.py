@@ -0,0 +1,263 @@
+"""
+Incremental subreddit feeds.
+
+Each feed remembers the fullname of the newest post it has dealt with and asks Reddit
+only for posts newer than that with `before=`. When nothing is new, which is most polls,
+the response is an empty listing. Pagination is only followed when more posts arrived than
+fit on one page, such as after an outage.
+
+Polling doesn't move the cursor. Whoever handles the posts calls `advance` once they've
+been delivered, so anything that couldn't be delivered is fetched again next poll.
+
+Feeds can be combined into a `FeedGroup`, which polls all of their subreddits with one
+`r/a+b+c/new` request and hands each post back to the feed for its subreddit, so adding
+a feed doesn't add a request.
+
+Older history can be walked with `backfill`, newest first, to fill a channel after a long
+downtime or seed a new one.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import typing as t
+
+import aiohttp
+
+from dreaf.db.keyvalue import kv
+from .request import Post, Sort, fetch_by_id, fetch_listing, get_session
+
+log = logging.getLogger(__name__)
+
+cursors = kv.namespace("reddit_cursors", dict)
+
+
+class Feed:
+    """The new posts of a subreddit, returned oldest first and each only once."""
+
+    # the most Reddit returns per listing page
+    PAGE_SIZE = 100
+    # an empty result is normal, but if it persists the cursor post may have been removed
+    VERIFY_AFTER = 20
+
+    def __init__(self, subreddit: str, *, cls: t.Type[Post] = Post, first_limit: int = 25, max_pages: int = 10):
+        self.subreddit = subreddit
+        self.cls = cls
+        self.first_limit = first_limit
+        self.max_pages = max_pages
+        self._empty_polls = 0
+
+    def __repr__(self):
+        return f"<Feed r/{self.subreddit}>"
+
+    @property
+    def key(self) -> str:
+        return self.subreddit.casefold()
+
+    async def cursor(self) -> t.Optional[t.Dict[str, t.Any]]:
+        return await cursors.get(self.key)
+
+    async def poll(self, session: aiohttp.ClientSession = None) -> t.List[Post]:
+        """Fetch the posts made since the cursor, which stays put until `advance` is called."""
+        children = await self._poll_children(session or get_session())
+        return self._build(children)
+
+    async def advance(self, posts: t.Sequence[Post], undelivered: t.Iterable[Post] = ()):
+        """
+        Move the cursor past the posts of a poll, stopping before the oldest undelivered one.
+
+        The posts are oldest first, as `poll` returns them. Any delivered after an undelivered
+        post are fetched again too, but they're recorded as posted so aren't sent twice.
+        """
+        undelivered = {post.fullname for post in undelivered}
+        newest = None
+        for post in posts:
+            if post.fullname in undelivered:
+                break
+            newest = post
+        if newest is not None:
+            await cursors.set(self.key, {"fullname": newest.fullname, "created": newest.created_utc})
+
+    def _build(self, children: t.List[t.Dict]) -> t.List[Post]:
+        """The posts of a listing, oldest first."""
+        posts = [self.cls(**child) for child in reversed(children)]
+        self.cls.load_posted(posts)
+        return posts
+
+    async def _poll_children(self, session: aiohttp.ClientSession) -> t.List[t.Dict]:
+        cursor = await self.cursor()
+
+        if cursor is None:
+            # first poll, so there's nothing to be newer than
+            listing = await fetch_listing(session, self.subreddit, params={"limit": self.first_limit})
+            children = listing['children']
+        else:
+            children = await self._fetch_since(session, cursor)
+            if children:
+                self._empty_polls = 0
+            else:
+                self._empty_polls += 1
+                if self._empty_polls >= self.VERIFY_AFTER:
+                    self._empty_polls = 0
+                    children = await self._verify_cursor(session, cursor)
+        return children
+
+    async def _fetch_since(self, session: aiohttp.ClientSession, cursor: t.Dict[str, t.Any]) -> t.List[t.Dict]:
+        """Every post newer than the cursor, newest first, following pages toward the present."""
+        children = []
+        before = cursor['fullname']
+        for _ in range(self.max_pages):
+            listing = await fetch_listing(session, self.subreddit, params={"limit": self.PAGE_SIZE, "before": before})
+            page = listing['children']
+            children = page + children
+            if len(page) < self.PAGE_SIZE:
+                return children
+            before = page[0]['data']['name']
+
+        log.warning(f"r/{self.subreddit} has more than {self.max_pages} pages of new posts, the rest follow next poll.")
+        return children
+
+    async def _verify_cursor(self, session: aiohttp.ClientSession, cursor: t.Dict[str, t.Any]) -> t.List[t.Dict]:
+        """
+        Check the cursor post still exists, as `before=` a removed post always returns nothing.
+
+        If it's gone, the newest page is filtered by creation time instead, which returns any
+        posts that were missed and gives a new cursor.
+        """
+        posts = await fetch_by_id(session, cursor['fullname'])
+        if posts and not posts[0]['data'].get('removed_by_category'):
+            return []
+
+        log.info(f"Cursor post {cursor['fullname']} for r/{self.subreddit} was removed, resyncing by time.")
+        listing = await fetch_listing(session, self.subreddit, params={"limit": self.first_limit})
+        return [c for c in listing['children'] if c['data']['created_utc'] > cursor['created']]
+
+
+class FeedGroup(Feed):
+    """
+    Several feeds polled together through one combined listing of their subreddits.
+
+    The group keeps a single cursor for the combined listing. Each post is built with the
+    class of the feed for its subreddit, and `split` sorts a poll back out by feed so each
+    gets its own handling.
+    """
+
+    def __init__(self, feeds: t.Sequence[Feed], *, max_pages: int = 10):
+        if not feeds:
+            raise ValueError("A feed group needs at least one feed.")
+        super().__init__(
+            "+".join(f.subreddit for f in feeds),
+            first_limit=min(sum(f.first_limit for f in feeds), self.PAGE_SIZE),
+            max_pages=max_pages,
+        )
+        self.feeds = {f.key: f for f in feeds}
+
+    def __repr__(self):
+        return f"<FeedGroup r/{self.subreddit}>"
+
+    @property
+    def key(self) -> str:
+        # the same group in any order shares a cursor
+        return "+".join(sorted(self.feeds))
+
+    def feed_for(self, subreddit: str) -> t.Optional[Feed]:
+        return self.feeds.get(subreddit.casefold())
+
+    def _build(self, children: t.List[t.Dict]) -> t.List[Post]:
+        by_feed: t.Dict[Feed, t.List[Post]] = {}
+        posts = []
+        for child in reversed(children):
+            feed = self.feed_for(child['data']['subreddit'])
+            if feed is None:
+                log.debug(f"Skipping post from r/{child['data']['subreddit']}, which isn't in {self!r}.")
+                continue
+            post = feed.cls(**child)
+            by_feed.setdefault(feed, []).append(post)
+            posts.append(post)
+
+        for feed, feed_posts in by_feed.items():
+            feed.cls.load_posted(feed_posts)
+        return posts
+
+    def split(self, posts: t.Iterable[Post]) -> t.Dict[Feed, t.List[Post]]:
+        """The posts of a poll by the feed they belong to, each still oldest first."""
+        by_feed = {feed: [] for feed in self.feeds.values()}
+        for post in posts:
+            feed = self.feed_for(post.subreddit)
+            if feed is not None:
+                by_feed[feed].append(post)
+        return by_feed
+
+
+def group_feeds(feeds: t.Iterable[Feed], *, size: int = 25) -> t.List[FeedGroup]:
+    """
+    Combine feeds into as few groups as possible.
+
+    Groups are capped at `size` subreddits to keep the listing URL a reasonable length.
+    """
+    feeds = list(feeds)
+    return [FeedGroup(feeds[i:i + size]) for i in range(0, len(feeds), size)]
+
+
+async def backfill(
+    subreddit: str,
+    *,
+    cls: t.Type[Post] = Post,
+    since: float = None,
+    until_permalink: str = None,
+    limit: int = None,
+    page_size: int = 100,
+    prefetch: int = 1,
+    session: aiohttp.ClientSession = None,
+) -> t.AsyncIterator[Post]:
+    """
+    Iterate over a subreddit's new posts from newest to oldest, following `after` cursors.
+
+    Stops at the first post created at or before the `since` timestamp, at the post with
+    `until_permalink`, after `limit` posts, or when Reddit has no more pages. While one page
+    is being consumed, up to `prefetch` further pages are fetched in the background. Only
+    those pages are ever held, so memory use doesn't grow with the length of the backfill.
+    """
+    session = session or get_session()
+    pages: asyncio.Queue = asyncio.Queue(maxsize=max(prefetch, 1))
+
+    async def fetch_pages():
+        after = None
+        while True:
+            params = {"limit": page_size}
+            if after:
+                params["after"] = after
+            listing = await fetch_listing(session, subreddit, sort=Sort.new, params=params)
+            await pages.put(listing['children'])
+            after = listing.get('after')
+            if not after or not listing['children']:
+                await pages.put(None)
+                return
+
+    fetcher = asyncio.get_running_loop().create_task(fetch_pages())
+    count = 0
+    try:
+        while True:
+            getter = asyncio.ensure_future(pages.get())
+            await asyncio.wait((getter, fetcher), return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                # the fetcher finished without queueing the page, so it must have failed
+                getter.cancel()
+                fetcher.result()
+            children = getter.result()
+            if children is None:
+                return
+
+            posts = [cls(**child) for child in children]
+            cls.load_posted(posts)
+            for post in posts:
+                if since is not None and post.created_utc <= since:
+                    return
+                if until_permalink is not None and post.permalink == until_permalink:
+                    return
+                yield post
+                count += 1
+                if limit is not None and count >= limit:
+                    return
+    finally:
+        fetcher.cancel()
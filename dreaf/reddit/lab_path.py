@@ -3,18 +3,16 @@ from __future__ import annotations
 import logging
 import typing as t
 
-import aiohttp
 import discord
 
-from .request import Post, Sort, SortTime, get_posts
-from dreaf import db
+from .feeds import Feed
+from .posted import PostedIndex
+from .request import Post, Sort, SortTime, get_posts, get_session
+from dreaf import constants, db
 
 
 log = logging.getLogger(__name__)
 
-
-SESSION = aiohttp.ClientSession(headers={"Content-Type": "application/json", "charset": "UTF-8"})
-
 LAB_FLARE = ":Text: Arcane Labyrinth"
 DISMAL_FLARE = ":Text: Dismal Maze"
 
@@ -25,11 +23,30 @@ MAZE_TYPES = {
 
 
 class LabPathPost(Post, db.Table):
+    _repo = db.Repository(
+        "labpath_posted",
+        {
+            "fullname": "TEXT PRIMARY KEY",
+            "created": "INTEGER NOT NULL",
+            "posted": "BOOLEAN default FALSE",
+        },
+        key="fullname",
+        indexes=("created",),
+    )
+    _posted = PostedIndex(_repo, retention=constants.REDDIT_RETENTION_DAYS * 24 * 60 * 60)
+
+    __slots__ = ("posted",)
+
+    subreddit_icon = "https://styles.redditmedia.com/t5_1owwk1/styles/communityIcon_oip3qnbqst961.jpg"
+
     def __init__(self, **data):
         super().__init__(**data)
-        self.maze = MAZE_TYPES.get(data['data']['link_flair_text'], {"colour": discord.Colour.lighter_grey()})
-        self.subreddit_icon = "https://styles.redditmedia.com/t5_1owwk1/styles/communityIcon_oip3qnbqst961.jpg"
-        self.posted = self.is_posted()
+        # set for a whole listing at once by `load_posted`
+        self.posted = False
+
+    @property
+    def maze(self) -> t.Dict[str, t.Any]:
+        return MAZE_TYPES.get(self.flair, {"colour": discord.Colour.lighter_grey()})
 
     def embed(self):
         embed = super().embed()
@@ -43,73 +60,53 @@ class LabPathPost(Post, db.Table):
             self.set_posted()
 
     def save(self):
-        self._insert(self.permalink, self.created.timestamp())
+        self._insert(self.fullname, self.created.int_timestamp)
 
     def is_posted(self) -> bool:
-        result = self._select(self.permalink)
+        result = self._select(self.fullname)
         if not result:
             return False
-        _permalink, _created, posted = result
+        _fullname, _created, posted = result
         return bool(posted)
 
     def set_posted(self):
-        self._insert(self.permalink, self.created.timestamp(), True)
+        self._posted.record([self])
+
+    @classmethod
+    def load_posted(cls, posts: t.Sequence[LabPathPost]):
+        cls._posted.load(posts)
+
+    @classmethod
+    def set_posted_many(cls, posts: t.Sequence[LabPathPost]):
+        cls._posted.record(posts)
 
     @classmethod
     async def fetch(cls, *, sort: Sort = Sort.new, time: SortTime = None, limit: int = 4) -> t.List[LabPathPost]:
-        return await get_posts(SESSION, "Lab_path", sort=sort, time=time, limit=limit, cls=cls)
+        return await get_posts(get_session(), "Lab_path", sort=sort, time=time, limit=limit, cls=cls)
+
+    @classmethod
+    async def fetch_new(cls) -> t.List[LabPathPost]:
+        """Fetch only the posts made since the last time this was called, oldest first."""
+        posts = await FEED.poll()
+        await FEED.advance(posts)
+        return posts
 
     @staticmethod
-    def _select(permalink: str):
-        cursor = db.conn.execute(
-            """
-            SELECT permalink, created, posted
-            FROM labpath_posts
-            WHERE permalink = ?
-            """,
-            [permalink]
-        )
-        data = cursor.fetchone()
-        cursor.close()
-        return data
+    def _select(fullname: str):
+        return LabPathPost._repo.select(fullname)
 
     @staticmethod
-    def _insert(permalink: str, created: int, posted: bool = None):
+    def _insert(fullname: str, created: int, posted: bool = None):
         if posted is not None:
-            cursor = db.conn.execute(
-                """
-                INSERT INTO labpath_posts(permalink, created, posted) VALUES (?, ?, ?)
-                ON CONFLICT(permalink)
-                DO UPDATE SET
-                  created=excluded.created,
-                  posted=excluded.posted;
-                """,
-                [permalink, created, posted]
-            )
+            LabPathPost._repo.upsert(fullname=fullname, created=created, posted=posted)
         else:
-            cursor = db.conn.execute(
-                """
-                INSERT INTO labpath_posts(permalink, created) VALUES (?, ?)
-                ON CONFLICT(permalink)
-                DO UPDATE SET
-                  created=excluded.created;
-                """,
-                [permalink, created]
-            )
-        db.conn.commit()
-        cursor.close()
+            LabPathPost._repo.upsert(fullname=fullname, created=created)
 
-    @staticmethod
-    def _create_table():
-        log.info("Ensuring table exists: labpath_posts")
-        cursor = db.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS labpath_posts (
-              permalink TEXT PRIMARY KEY,
-              created INTEGER NOT NULL,
-              posted BOOLEAN default FALSE
-            );
-            """
-        )
-        db.conn.commit()
-        cursor.close()
+    @classmethod
+    def _create_table(cls):
+        cls._repo.create()
+        if db.backend.table_exists("labpath_posts"):
+            cls._posted.import_permalinks("labpath_posts")
+
+
+FEED = Feed("Lab_path", cls=LabPathPost)
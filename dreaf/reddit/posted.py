@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import time
+import typing as t
+from collections import OrderedDict
+
+from dreaf import db
+
+if t.TYPE_CHECKING:
+    from .request import Post
+
+log = logging.getLogger(__name__)
+
+POST_ID = re.compile(r"/comments/([0-9a-z]+)", re.IGNORECASE)
+
+
+def permalink_fullname(permalink: str) -> t.Optional[str]:
+    """The fullname of the post a permalink is for, such as `t3_mkxg2v`."""
+    match = POST_ID.search(permalink)
+    return f"t3_{match.group(1).lower()}" if match else None
+
+
+class PostedIndex:
+    """
+    Which posts of a feed have already been sent, checked a whole listing at a time.
+
+    Posts are stored by their fullname, and the most recently seen posted fullnames are
+    remembered in memory, as a new listing mostly overlaps the last one. Anything not
+    remembered is looked up with one query for the whole listing.
+
+    With a `retention` in seconds, records older than that are pruned by `compact`, and
+    any post older than that counts as already sent since its record may be gone.
+    """
+
+    def __init__(self, repo: db.Repository, *, size: int = 2000, retention: float = None):
+        self.repo = repo
+        self.size = size
+        self.retention = retention
+        self._recent: t.OrderedDict[str, None] = OrderedDict()
+
+    def __repr__(self):
+        return f"<PostedIndex '{self.repo.table}' recent={len(self._recent)}>"
+
+    def cutoff(self) -> t.Optional[float]:
+        """The creation time before which posts are no longer tracked."""
+        return time.time() - self.retention if self.retention else None
+
+    def _remember(self, fullnames: t.Iterable[str]):
+        for fullname in fullnames:
+            self._recent[fullname] = None
+            self._recent.move_to_end(fullname)
+        while len(self._recent) > self.size:
+            self._recent.popitem(last=False)
+
+    def load(self, posts: t.Sequence[Post]):
+        """Set `posted` on each of the posts."""
+        cutoff = self.cutoff() or 0
+        unknown = [p.fullname for p in posts if p.fullname not in self._recent and p.created_utc >= cutoff]
+        posted = set(self._recent.keys() & {p.fullname for p in posts})
+        if unknown:
+            rows = self.repo.select_in("fullname", unknown, columns=("fullname", "posted"))
+            found = [row[0] for row in rows if row[1]]
+            self._remember(found)
+            posted.update(found)
+
+        for post in posts:
+            post.posted = post.fullname in posted or post.created_utc < cutoff
+
+    def record(self, posts: t.Sequence[Post]):
+        """Save the posts as sent, in a single write."""
+        if not posts:
+            return
+        self.repo.upsert_many(
+            {"fullname": p.fullname, "created": int(p.created_utc), "posted": True} for p in posts
+        )
+        self._remember(p.fullname for p in posts)
+        for post in posts:
+            post.posted = True
+
+    async def compact(self, *, batch_size: int = 500, pause: float = 0.5) -> int:
+        """
+        Prune the records older than the retention, returning how many were removed.
+
+        Rows are deleted a batch at a time with a pause between, so a large prune doesn't
+        hold up other database work.
+        """
+        cutoff = self.cutoff()
+        if cutoff is None:
+            return 0
+        total = 0
+        while True:
+            deleted = self.repo.prune("created", int(cutoff), limit=batch_size)
+            total += deleted
+            if deleted < batch_size:
+                break
+            await asyncio.sleep(pause)
+        if total:
+            log.info(f"Pruned {total} posted records from {self.repo.table}.")
+        return total
+
+    def import_permalinks(self, table: str):
+        """Move the records of an old table keyed by permalink into this one, then drop it."""
+        rows = db.backend.fetchall(f"SELECT permalink, created, posted FROM {table};")
+        converted = []
+        for permalink, created, posted in rows:
+            fullname = permalink_fullname(permalink)
+            if fullname:
+                # old rows hold float timestamps, which may have been stored as text
+                converted.append({"fullname": fullname, "created": int(float(created)), "posted": bool(posted)})
+        with db.unit_of_work():
+            self.repo.upsert_many(converted)
+            db.backend.execute(f"DROP TABLE {table};")
+            db.commit()
+        log.info(f"Moved {len(converted)} of {len(rows)} records from {table} to {self.repo.table}.")
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import logging
+import time
+import typing as t
+
+log = logging.getLogger(__name__)
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limited by Reddit, retry after {retry_after:.0f}s.")
+        self.retry_after = retry_after
+
+
+class RateLimit:
+    """The request budget Reddit reports in the `X-Ratelimit-*` headers of each response."""
+
+    def __init__(self):
+        self.remaining: t.Optional[float] = None
+        self.used: t.Optional[int] = None
+        self._reset_at: t.Optional[float] = None
+
+    def __repr__(self):
+        return f"<RateLimit remaining={self.remaining} reset_in={self.reset_in:.0f}s>"
+
+    def update(self, headers: t.Mapping[str, str]):
+        try:
+            remaining = float(headers["X-Ratelimit-Remaining"])
+            reset = float(headers["X-Ratelimit-Reset"])
+        except (KeyError, ValueError):
+            return
+        self.remaining = remaining
+        self.used = int(float(headers.get("X-Ratelimit-Used", 0)))
+        self._reset_at = time.monotonic() + reset
+
+    @property
+    def reset_in(self) -> float:
+        if self._reset_at is None:
+            return 0.0
+        return max(self._reset_at - time.monotonic(), 0.0)
+
+    def rate(self) -> t.Optional[float]:
+        """Requests per second that can be made until the window resets, if known."""
+        if self.remaining is None or not self.reset_in:
+            return None
+        return self.remaining / self.reset_in
+
+    def check(self, response):
+        """Record a response's headers, raising `RateLimited` if it was refused."""
+        self.update(response.headers)
+        if response.status == 429:
+            retry_after = self.reset_in or float(response.headers.get("Retry-After", 60))
+            raise RateLimited(retry_after)
+
+
+rate_limit = RateLimit()
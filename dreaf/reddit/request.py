@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 import typing as t
 from enum import Enum
 from html import unescape
@@ -10,9 +11,36 @@ import aiohttp
 import discord
 import pendulum
 
+from dreaf.http import clients
+from .breaker import breakers
+from .cache import ResponseCache
+from .ratelimit import rate_limit
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson:
+    loads = orjson.loads
+else:
+    loads = json.loads
+
 
 log = logging.getLogger(__name__)
 
+HEADERS = {"User-Agent": "python3:scragly/dreaf (by /u/scragly91)"}
+# where public listings are requested from, which can be pointed at a stand-in server
+BASE_URL = "https://reddit.com"
+
+# for lookups users repeat, such as a single post or the `post` command
+response_cache = ResponseCache(loads=loads)
+
+
+def get_session() -> aiohttp.ClientSession:
+    """The shared session for Reddit requests."""
+    return clients.session("reddit", headers=HEADERS)
+
 
 class Sort(Enum):
     hot = "hot"
@@ -29,20 +57,51 @@ class SortTime(Enum):
 
 
 class Post:
+    """
+    The fields of a reddit post that embeds use.
+
+    Only raw values are kept from the listing. The title, timestamp and gallery images are
+    worked out when first used, so posts that are filtered out cost little.
+    """
+
+    __slots__ = (
+        "fullname", "created_utc", "raw_title", "url", "author", "subreddit", "permalink",
+        "flair", "selftext", "_gallery", "_images",
+    )
+
     def __init__(self, **data):
-        self._raw_data = data["data"]
-        self.created = pendulum.from_timestamp(data['data']['created_utc'])
-        title = unescape(data['data']['title'])
+        data = data['data']
+        self.fullname = data['name']
+        self.created_utc = data['created_utc']
+        self.raw_title = data['title']
+        self.url = data.get('url')
+        self.author = data['author']
+        self.subreddit = data['subreddit']
+        self.permalink = f"https://reddit.com{data['permalink']}"
+        self.flair = data.get('link_flair_text')
+        self.selftext = data.get('selftext', '')
+        # only the parts of a gallery needed to list its images are kept
+        self._gallery = (data['gallery_data'], data['media_metadata']) if data.get('is_gallery') else None
+        self._images: t.Optional[t.List[str]] = None
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.fullname} r/{self.subreddit}>"
+
+    @property
+    def created(self) -> pendulum.DateTime:
+        return pendulum.from_timestamp(self.created_utc)
+
+    @property
+    def title(self) -> str:
+        title = unescape(self.raw_title)
         if len(title) > 250:
             title = f"{title[:250]}..."
-        self.title = title
-        self.url = data['data'].get('url')
-        self.author = data['data']['author']
-        self.subreddit = data['data']['subreddit']
-        self.permalink = f"https://reddit.com{data['data']['permalink']}"
-        text = data['data'].get('selftext', '')
-        self.text = f"{text[:240]}.." if len(text) > 242 else text
-        self.images = self.gallery_images()
+        return title
+
+    @property
+    def text(self) -> str:
+        text = self.selftext
+        return f"{text[:240]}.." if len(text) > 242 else text
 
     @property
     def is_image(self) -> bool:
@@ -54,21 +113,32 @@ class Post:
     @property
     def is_gallery(self) -> bool:
         """Returns True if the post links to a reddit image gallery."""
-        return "is_gallery" in self._raw_data
+        return self._gallery is not None
+
+    @property
+    def images(self) -> t.List[str]:
+        if self._images is None:
+            self._images = self.gallery_images()
+        return self._images
+
+    @classmethod
+    def load_posted(cls, posts: t.Sequence[Post]):
+        """Look up whether a listing's posts have already been sent, for feeds that track it."""
 
     def gallery_images(self) -> t.List[str]:
         """Return a list of image URLs for a gallery post."""
         if not self.is_gallery:
             return []
-        gallery_items = [i["media_id"] for i in self._raw_data["gallery_data"]["items"]]
+        gallery_data, media_metadata = self._gallery
+        gallery_items = [i["media_id"] for i in gallery_data["items"]]
         image_urls = dict()
-        for img_id, data in self._raw_data["media_metadata"].items():
+        for img_id, data in media_metadata.items():
             if data["status"] == "valid":
                 try:
                     image_urls[img_id] = unescape(data["s"]["u"])
                 except KeyError:
                     log.warning("Reddit post encountered bad keys.")
-                    log.info(str(self._raw_data))
+                    log.info(str(media_metadata))
                     return []
         return [image_urls[i] for i in gallery_items if i in image_urls]
 
@@ -101,32 +171,51 @@ class Post:
         sort: Sort = Sort.new,
         time: SortTime = None,
         limit: int = 25,
+        before: str = None,
     ):
-        """Request posts from a subreddit."""
-        params = {}
-        if time:
-            params['t'] = time.value
-        if limit:
-            params['limit'] = limit
-
-        url = f"https://reddit.com/r/{subreddit}/{sort.value}.json"
-        async with session.get(url, params=params) as resp:
-            data = await resp.json()
-
-        return [cls(**p) for p in data['data']['children']]
+        """Request posts from a subreddit, only those newer than the `before` fullname if given."""
+        return await get_posts(session, subreddit, sort=sort, time=time, limit=limit, before=before, cls=cls)
 
     @classmethod
     async def get_post(cls, session: aiohttp.ClientSession, url):
-        """Get a single post from reddit."""
-        async with session.get(f"{url}.json") as resp:
-            data = await resp.json()
+        """Get a single post from reddit, reusing a recent lookup of the same post."""
+        response = await response_cache.get(session, f"{url.rstrip('/')}.json")
+        if response.data is None:
+            return None
 
-        for item in data[0]["data"]["children"]:
+        for item in response.data[0]["data"]["children"]:
             if item["kind"] != "t3":
                 continue
             return cls(**item)
 
 
+async def fetch_listing(
+    session: aiohttp.ClientSession,
+    subreddit: str,
+    *,
+    sort: Sort = Sort.new,
+    params: t.Dict[str, t.Any] = None,
+) -> t.Dict[str, t.Any]:
+    """Request a page of a subreddit listing, returning its `data` with `children`, `before` and `after`."""
+    url = f"{BASE_URL}/r/{subreddit}/{sort.value}.json"
+    async with breakers["listing"], session.get(url, params=params or {}) as resp:
+        rate_limit.check(resp)
+        resp.raise_for_status()
+        data = loads(await resp.read())
+    return data['data']
+
+
+async def fetch_by_id(session: aiohttp.ClientSession, fullname: str) -> t.List[t.Dict[str, t.Any]]:
+    """Request a single post by fullname, returning an empty list if it can't be found."""
+    async with breakers["by_id"], session.get(f"{BASE_URL}/by_id/{fullname}.json") as resp:
+        rate_limit.check(resp)
+        if resp.status >= 500:
+            resp.raise_for_status()
+        if resp.status != 200:
+            return []
+        return loads(await resp.read())['data']['children']
+
+
 async def get_posts(
     session: aiohttp.ClientSession,
     subreddit: str,
@@ -134,18 +223,19 @@ async def get_posts(
     sort: Sort = Sort.new,
     time: SortTime = None,
     limit: int = 25,
+    before: str = None,
     cls=Post
 ):
-    """Request posts from a subreddit."""
+    """Request posts from a subreddit, only those newer than the `before` fullname if given."""
     params = {}
     if time:
         params['t'] = time.value
     if limit:
         params['limit'] = limit
+    if before:
+        params['before'] = before
 
-    url = f"https://reddit.com/r/{subreddit}/{sort.value}.json"
-    async with session.get(url, params=params) as resp:
-        print(await resp.text())
-        data = await resp.json()
-
-    return [cls(**p) for p in data['data']['children']]
+    listing = await fetch_listing(session, subreddit, sort=sort, params=params)
+    posts = [cls(**p) for p in listing['children']]
+    cls.load_posted(posts)
+    return posts
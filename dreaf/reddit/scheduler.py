@@ -0,0 +1,178 @@
+"""
+Polls any number of subreddit feeds from a single task, within Reddit's rate limit.
+
+Each feed's interval adapts to how active the subreddit is: it shortens when a poll finds
+new posts and lengthens when it doesn't, between the feed's minimum and maximum. Polls
+are spread out with random jitter so feeds don't fire together. If the combined poll rate
+would use more than a share of the budget Reddit reports, every interval is stretched to
+fit, and when the budget is nearly gone polling pauses until the window resets.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import random
+import time
+import typing as t
+
+from .breaker import CircuitOpen
+from .feeds import Feed
+from .ratelimit import RateLimit, RateLimited, rate_limit
+from .request import Post
+
+log = logging.getLogger(__name__)
+
+# returns the posts it couldn't deliver, which are fetched again next poll
+Handler = t.Callable[[t.List[Post]], t.Awaitable[t.Optional[t.List[Post]]]]
+
+
+class ScheduledFeed:
+    """A feed along with how often it's polled and what's done with its new posts."""
+
+    # interval multipliers after a poll finds posts, and after it doesn't
+    SPEED_UP = 0.5
+    SLOW_DOWN = 1.25
+
+    def __init__(self, feed: Feed, handler: Handler, *, min_interval: float, max_interval: float):
+        self.feed = feed
+        self.handler = handler
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.next_poll = 0.0
+        self.last_poll: t.Optional[float] = None
+        self.last_count = 0
+        self.errors = 0
+
+    def __repr__(self):
+        return f"<ScheduledFeed r/{self.feed.subreddit} interval={self.interval:.0f}s>"
+
+    def __lt__(self, other: ScheduledFeed):
+        return self.next_poll < other.next_poll
+
+    def adapt(self, count: int):
+        self.last_count = count
+        factor = self.SPEED_UP if count else self.SLOW_DOWN
+        self.interval = min(max(self.interval * factor, self.min_interval), self.max_interval)
+
+
+class PollScheduler:
+    """Runs feed polls in order of when each is due."""
+
+    def __init__(
+        self,
+        *,
+        budget_share: float = 0.5,
+        reserve: float = 5,
+        jitter: float = 0.2,
+        max_stretch: float = 8,
+        rate: RateLimit = rate_limit,
+    ):
+        self.budget_share = budget_share
+        self.reserve = reserve
+        self.jitter = jitter
+        self.max_stretch = max_stretch
+        self.rate = rate
+        self.feeds: t.List[ScheduledFeed] = []
+        self._queue: t.List[ScheduledFeed] = []
+
+    def __repr__(self):
+        return f"<PollScheduler feeds={len(self.feeds)}>"
+
+    def add(self, feed: Feed, handler: Handler, *, min_interval: float = 60, max_interval: float = 60 * 30):
+        """Poll `feed` from now on, passing any new posts to `handler`."""
+        scheduled = ScheduledFeed(feed, handler, min_interval=min_interval, max_interval=max_interval)
+        # stagger the first polls rather than running them all at once
+        scheduled.next_poll = time.monotonic() + random.uniform(0, min(min_interval, 30))
+        self.feeds.append(scheduled)
+        heapq.heappush(self._queue, scheduled)
+        return scheduled
+
+    def stretch(self) -> float:
+        """
+        How much every interval is multiplied by to stay within the share of the rate limit.
+
+        It's capped at `max_stretch` so a feed is always polled again eventually.
+        """
+        allowed = self.rate.rate()
+        if allowed is None or not self.feeds:
+            return 1.0
+        if not allowed:
+            return self.max_stretch
+        demand = sum(1 / f.interval for f in self.feeds)
+        return min(max(demand / (allowed * self.budget_share), 1.0), self.max_stretch)
+
+    def delay(self, scheduled: ScheduledFeed) -> float:
+        """How long until the feed should next be polled."""
+        if self.rate.remaining is not None and self.rate.remaining <= 0 and self.rate.reset_in:
+            # the budget is used up, so wait for it to reset rather than stretching
+            return self.rate.reset_in
+        return scheduled.interval * self.stretch()
+
+    def _reschedule(self, scheduled: ScheduledFeed, delay: float):
+        jitter = random.uniform(1 - self.jitter, 1 + self.jitter)
+        scheduled.next_poll = time.monotonic() + delay * jitter
+        heapq.heappush(self._queue, scheduled)
+
+    async def _poll(self, scheduled: ScheduledFeed):
+        try:
+            posts = await scheduled.feed.poll()
+        except (RateLimited, CircuitOpen) as e:
+            log.warning(f"Polling r/{scheduled.feed.subreddit}: {e}")
+            self._reschedule(scheduled, max(e.retry_after, scheduled.interval))
+            return
+        except Exception:
+            scheduled.errors += 1
+            log.exception(f"Polling r/{scheduled.feed.subreddit} failed.")
+            # back off on repeated failures, but never further than the longest interval
+            delay = min(scheduled.interval * 2 ** scheduled.errors, scheduled.max_interval)
+            self._reschedule(scheduled, delay)
+            return
+
+        scheduled.errors = 0
+        scheduled.last_poll = time.monotonic()
+        scheduled.adapt(len(posts))
+        # the rate limit takes priority over the feed's longest interval
+        stretch = self.stretch()
+        self._reschedule(scheduled, self.delay(scheduled))
+        if stretch > 1:
+            log.debug(f"Reddit feed intervals stretched x{stretch:.1f} to stay within the rate limit.")
+
+        if posts:
+            try:
+                undelivered = await scheduled.handler(posts) or []
+            except Exception:
+                # the cursor stays put, so the posts are fetched again next poll
+                log.exception(f"Handling new posts from r/{scheduled.feed.subreddit} failed.")
+                return
+            if undelivered:
+                log.info(f"{len(undelivered)} posts from r/{scheduled.feed.subreddit} weren't delivered, retrying next poll.")
+            await scheduled.feed.advance(posts, undelivered)
+
+    async def run(self):
+        """Poll each feed as it comes due, forever."""
+        while True:
+            if not self._queue:
+                await asyncio.sleep(1)
+                continue
+
+            if self.rate.remaining is not None and self.rate.remaining <= self.reserve and self.rate.reset_in:
+                log.info(f"Reddit rate limit nearly used, pausing feeds for {self.rate.reset_in:.0f}s.")
+                await asyncio.sleep(self.rate.reset_in)
+                continue
+
+            scheduled = self._queue[0]
+            delay = scheduled.next_poll - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            heapq.heappop(self._queue)
+            try:
+                await self._poll(scheduled)
+            except asyncio.CancelledError:
+                # keep the feed scheduled for when polling is restarted
+                if scheduled not in self._queue:
+                    heapq.heappush(self._queue, scheduled)
+                raise